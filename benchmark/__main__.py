@@ -0,0 +1,24 @@
+"""
+Runs one of the benchmarks, the endpoint workload by default:
+
+    python -m benchmark [workload|generator|concurrency|structure_import|query_plans|serialization|cold_start] [options]
+"""
+import runpy
+import sys
+
+
+COMMANDS = ('workload', 'generator', 'concurrency', 'structure_import', 'query_plans', 'serialization', 'cold_start')
+
+
+def main():
+    command = 'workload'
+    if len(sys.argv) > 1 and not sys.argv[1].startswith('-'):
+        command = sys.argv.pop(1)
+    if command not in COMMANDS:
+        sys.exit(f'unknown benchmark {command}, expected one of: {", ".join(COMMANDS)}')
+    sys.argv[0] = f'benchmark.{command}'
+    runpy.run_module(f'benchmark.{command}', run_name='__main__', alter_sys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import json
+import time
+from typing import Any, AsyncIterator, Optional
+
+
+class AsgiClient:
+    """
+    Minimal in-process HTTP client for an ASGI app, so benchmarks exercise the
+    full FastAPI stack without a socket or any extra dependency.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def post(self, path: str, payload: Any, headers: Optional[dict[str, str]] = None) -> tuple[int, bytes]:
+        return await self.request('POST', path, json.dumps(payload).encode(), headers)
+
+    async def get(self, path: str, headers: Optional[dict[str, str]] = None) -> tuple[int, bytes]:
+        return await self.request('GET', path, b'', headers)
+
+    async def request(
+            self, method: str, path: str, body: bytes, headers: Optional[dict[str, str]] = None,
+    ) -> tuple[int, bytes]:
+        raw_headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ]
+        for name, value in (headers or {}).items():
+            raw_headers.append((name.lower().encode(), value.encode()))
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'headers': raw_headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {'type': 'http.disconnect'}
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        status = 0
+        chunks: list[bytes] = []
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, receive, send)
+        return status, b''.join(chunks)
+
+    async def post_json(self, path: str, payload: Any) -> Any:
+        status, body = await self.post(path, payload)
+        if status != 200:
+            raise RuntimeError(f'{path} returned {status}: {body[:200]!r}')
+        return json.loads(body)
+
+
+@contextlib.asynccontextmanager
+async def running(app, timeout: float = 120.0) -> AsyncIterator[AsgiClient]:
+    """
+    Runs the app's lifespan around a benchmark, as a server would, and waits
+    until it reports ready.
+    """
+    async with app.router.lifespan_context(app):
+        client = AsgiClient(app)
+        deadline = time.monotonic() + timeout
+        while (await client.get('/api/health/ready'))[0] != 200:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'app not ready after {timeout}s')
+            await asyncio.sleep(0.01)
+        yield client
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,114 @@
+"""
+Cold start benchmark: time from importing main to the first responses of a
+fresh process, with the startup warm-up on and off.
+
+Each mode runs in its own interpreter against a copy of the same generated
+database, as a new instance would. With warm-up, the first requests are sent
+once /api/health/ready answers, as a load balancer would; without it, as
+soon as the lifespan has started:
+
+    python -m benchmark.cold_start --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark.concurrency import REPO_ROOT
+
+
+async def measure(args: argparse.Namespace) -> dict:
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+
+    from benchmark.asgi import AsgiClient
+
+    with open(args.dataset) as f:
+        dataset = json.load(f)
+    client = AsgiClient(main.app)
+    async with main.app.router.lifespan_context(main.app):
+        serving = time.perf_counter()
+        while (await client.get('/api/health/ready'))[0] != 200:
+            await asyncio.sleep(0.001)
+        ready = time.perf_counter()
+
+        latencies = {}
+        requests = (
+            ('get', '/api/task/get', {'uuid': dataset['task_uuids'][0], 'calculate_progress': True}),
+            ('list-with-status', '/api/task/list-with-status', {'runbook_uuid': dataset['runbook_uuids'][0]}),
+            ('get-status-updates', '/api/task/get-status-updates', {'task_uuid': dataset['leaf_uuids'][0]}),
+        )
+        for name, path, payload in requests:
+            request_started = time.perf_counter()
+            await client.post_json(path, payload)
+            latencies[name] = time.perf_counter() - request_started
+        first_response = ready + latencies['get']
+
+    return {
+        'import_ms': (imported - started) * 1000,
+        'startup_ms': (serving - imported) * 1000,
+        'ready_ms': (ready - started) * 1000,
+        'first_response_ms': (first_response - started) * 1000,
+        **{f'{name}_ms': seconds * 1000 for name, seconds in latencies.items()},
+    }
+
+
+def run_mode(warm_up: bool, database: str, dataset: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(database, f'{tmp}/bench.db')
+        env = dict(os.environ)
+        env['WAVERUNNER_DATABASE_URL'] = f'sqlite:///{tmp}/bench.db'
+        env['WAVERUNNER_WARM_UP'] = str(warm_up)
+        command = [sys.executable, '-m', 'benchmark.cold_start', '--child', '--dataset', dataset]
+        output = subprocess.run(command, env=env, cwd=REPO_ROOT, check=True, capture_output=True, text=True)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per mode')
+    parser.add_argument('--width', type=int, default=5)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--dataset', help=argparse.SUPPRESS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args))))
+        return
+
+    from sqlalchemy import create_engine
+
+    import model
+    from benchmark.generator import generate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{tmp}/bench.db')
+        model.upgrade(engine)
+        dataset = generate(engine, width=args.width, depth=args.depth)
+        engine.dispose()
+        with open(f'{tmp}/dataset.json', 'w') as f:
+            json.dump(dataset.to_dict(), f)
+
+        results = {
+            mode: [run_mode(mode == 'warm', f'{tmp}/bench.db', f'{tmp}/dataset.json') for _ in range(args.runs)]
+            for mode in ('cold', 'warm')
+        }
+
+    metrics = list(results['cold'][0])
+    print(f'median of {args.runs} runs')
+    print(f'{"":<22}{"cold":>10}{"warm":>10}')
+    for metric in metrics:
+        cold, warm = (statistics.median(run[metric] for run in results[mode]) for mode in ('cold', 'warm'))
+        print(f'{metric.removesuffix("_ms"):<22}{cold:>8.1f}ms{warm:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Concurrency benchmark: p99 latency of /task/list-with-status while
+/task/update-status is being hammered.
+
+Each execution mode runs in its own interpreter against a fresh database,
+because the mode is picked when main.py is imported:
+
+    python -m benchmark.concurrency --mode both --writers 8 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark.asgi import AsgiClient, percentile, running
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def measure(args: argparse.Namespace) -> dict:
+    import main
+
+    main.db_engine.echo = False
+    async with running(main.app) as client:
+        return await measure_with(main, client, args)
+
+
+async def measure_with(main, client: AsgiClient, args: argparse.Namespace) -> dict:
+    project = await client.post_json('/api/project/create', {'name': 'bench'})
+    runbook = await client.post_json('/api/runbook/create', {
+        'project_uuid': project['created']['uuid'],
+        'name': 'bench',
+        'source': 'a',
+        'target': 'b',
+    })
+    runbook_uuid = runbook['created']['uuid']
+    imported = await client.post_json('/api/task/structure-import', {
+        'runbook_uuid': runbook_uuid,
+        'tasks': [
+            {
+                'description': f'task {i}',
+                'subtasks': [{'description': f'task {i}.{j}', 'subtasks': []} for j in range(args.subtasks)],
+            }
+            for i in range(args.tasks)
+        ],
+    })
+    leaves = [subtask['uuid'] for task in imported['tasks'] for subtask in task['subtasks']]
+
+    stop = asyncio.Event()
+    read_latencies: list[float] = []
+    write_latencies: list[float] = []
+
+    async def writer():
+        while not stop.is_set():
+            started = time.perf_counter()
+            await client.post_json('/api/task/update-status', {
+                'task_uuid': random.choice(leaves),
+                'status': random.choice(['IN_PROGRESS', 'COMPLETED']),
+                'detail': 'bench',
+            })
+            write_latencies.append(time.perf_counter() - started)
+            # in inline mode nothing above ever suspends, so yield explicitly
+            await asyncio.sleep(0)
+
+    async def read(scheduled: float):
+        await client.post_json('/api/task/list-with-status', {'runbook_uuid': runbook_uuid})
+        read_latencies.append(time.perf_counter() - scheduled)
+
+    async def reader():
+        # open loop: reads are issued on a fixed schedule and their latency is
+        # measured from the scheduled start, so time spent queued behind a
+        # blocked event loop is counted too
+        reads: list[asyncio.Task] = []
+        scheduled = time.perf_counter()
+        while not stop.is_set():
+            reads.append(asyncio.create_task(read(scheduled)))
+            scheduled += args.read_interval
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        await asyncio.gather(*reads)
+
+    workers = [asyncio.create_task(writer()) for _ in range(args.writers)]
+    workers.append(asyncio.create_task(reader()))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*workers)
+
+    return {
+        'mode': main.settings.execution_mode.value,
+        'writes': len(write_latencies),
+        'reads': len(read_latencies),
+        'read_p50_ms': percentile(read_latencies, 50) * 1000,
+        'read_p99_ms': percentile(read_latencies, 99) * 1000,
+        'write_p99_ms': percentile(write_latencies, 99) * 1000,
+    }
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env['WAVERUNNER_DATABASE_URL'] = f'sqlite:///{tmp}/bench.db'
+        env['WAVERUNNER_EXECUTION_MODE'] = mode
+        command = [
+            sys.executable, '-m', 'benchmark.concurrency', '--child',
+            '--writers', str(args.writers), '--read-interval', str(args.read_interval),
+            '--duration', str(args.duration), '--tasks', str(args.tasks), '--subtasks', str(args.subtasks),
+        ]
+        output = subprocess.run(command, env=env, cwd=REPO_ROOT, check=True, capture_output=True, text=True)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['inline', 'threadpool', 'both'], default='both')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--read-interval', type=float, default=0.05, help='seconds between reads')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--subtasks', type=int, default=4)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args))))
+        return
+
+    modes = ['inline', 'threadpool'] if args.mode == 'both' else [args.mode]
+    print(f'{"mode":<12}{"reads":>8}{"writes":>8}{"read p50":>12}{"read p99":>12}{"write p99":>12}')
+    for mode in modes:
+        result = run_mode(mode, args)
+        print(
+            f'{result["mode"]:<12}{result["reads"]:>8}{result["writes"]:>8}'
+            f'{result["read_p50_ms"]:>10.1f}ms{result["read_p99_ms"]:>10.1f}ms{result["write_p99_ms"]:>10.1f}ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
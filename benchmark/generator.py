@@ -0,0 +1,133 @@
+"""
+Synthetic benchmark data: projects with runbooks holding task trees of a
+given width and depth, imported through TaskService.structure_import.
+
+structure_import makes every task depend on its previous sibling; the
+dependency density is the fraction of tasks that keep that dependency.
+To benchmark a server, generate straight into its database and save the
+dataset for benchmark.workload --dataset:
+
+    python -m benchmark.generator --database-url sqlite:///waverunner.db --output dataset.json
+"""
+import argparse
+import json
+import random
+from typing import Any
+
+from sqlalchemy import Engine, create_engine, update
+from sqlalchemy.orm import Session
+
+
+class Dataset:
+    """
+    uuids of everything generated, for workloads to pick request targets from.
+    """
+
+    def __init__(self) -> None:
+        self.runbook_uuids: list[str] = []
+        self.task_uuids: list[str] = []
+        self.leaf_uuids: list[str] = []
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'runbook_uuids': self.runbook_uuids,
+            'task_uuids': self.task_uuids,
+            'leaf_uuids': self.leaf_uuids,
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> 'Dataset':
+        dataset = Dataset()
+        dataset.runbook_uuids = data['runbook_uuids']
+        dataset.task_uuids = data['task_uuids']
+        dataset.leaf_uuids = data['leaf_uuids']
+        return dataset
+
+
+def tree(width: int, depth: int, prefix: str = 'task') -> list[dict]:
+    if depth == 0:
+        return []
+    return [
+        {'description': f'{prefix} {i}', 'subtasks': tree(width, depth - 1, f'{prefix} {i}.')}
+        for i in range(width)
+    ]
+
+
+def generate(
+        engine: Engine,
+        projects: int = 1,
+        runbooks: int = 2,
+        width: int = 5,
+        depth: int = 3,
+        dependency_density: float = 1.0,
+        seed: int = 0,
+) -> Dataset:
+    import dto
+    import model
+    import service
+
+    project_service = service.ProjectService(engine)
+    runbook_service = service.RunbookService(engine)
+    task_service = service.TaskService(engine)
+
+    dataset = Dataset()
+    for p in range(projects):
+        project = project_service.create(dto.ProjectCreateRequest(name=f'project {p}')).created
+        for r in range(runbooks):
+            runbook = runbook_service.create(dto.RunbookCreateRequest(
+                project_uuid=project.uuid, name=f'runbook {p}.{r}', source='source', target='target',
+            )).created
+            imported = task_service.structure_import(dto.TaskStructureImportRequest.model_validate({
+                'runbook_uuid': runbook.uuid,
+                'tasks': tree(width, depth),
+            }))
+            dataset.runbook_uuids.append(runbook.uuid)
+
+            pending = list(imported.tasks)
+            while pending:
+                task = pending.pop()
+                dataset.task_uuids.append(task.uuid)
+                if task.subtasks:
+                    pending.extend(task.subtasks)
+                else:
+                    dataset.leaf_uuids.append(task.uuid)
+
+    if dependency_density < 1:
+        rng = random.Random(seed)
+        dropped = [
+            {'uuid': task_uuid, 'depends_on_task_uuid': None}
+            for task_uuid in dataset.task_uuids if rng.random() >= dependency_density
+        ]
+        if dropped:
+            with Session(engine) as session:
+                session.execute(update(model.Task), dropped)
+                session.commit()
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--projects', type=int, default=1)
+    parser.add_argument('--runbooks', type=int, default=2, help='runbooks per project')
+    parser.add_argument('--width', type=int, default=5)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--dependency-density', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True, help='dataset JSON file')
+    args = parser.parse_args()
+
+    import model
+
+    engine = create_engine(args.database_url)
+    model.upgrade(engine)
+    dataset = generate(
+        engine, args.projects, args.runbooks, args.width, args.depth, args.dependency_density, args.seed,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(dataset.to_dict(), f)
+    print(f'{len(dataset.runbook_uuids)} runbooks, {len(dataset.task_uuids)} tasks')
+
+
+if __name__ == '__main__':
+    main()
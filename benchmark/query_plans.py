@@ -0,0 +1,20 @@
+"""
+Query plan check: runs tests/test_query_plans.py, which fails if any
+statement behind the hot endpoints scans a whole table. Extra arguments go
+to pytest:
+
+    python -m benchmark.query_plans -k task_get
+"""
+import os
+import sys
+
+import pytest
+
+
+def main():
+    tests = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'test_query_plans.py')
+    sys.exit(pytest.main([tests, *sys.argv[1:]]))
+
+
+if __name__ == '__main__':
+    main()
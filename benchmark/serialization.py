@@ -0,0 +1,137 @@
+"""
+Response serialization benchmark on a single large task tree (default: one
+root over 21^3 leaves, about 10k tasks).
+
+Times /task/get of the root (served from the read cache after the first
+call, so almost all of it is response building) and a flat /task/list of
+the whole runbook, with fast responses on and off. Each mode runs in its
+own interpreter against a fresh database, because the setting is read when
+main.py is imported:
+
+    python -m benchmark.serialization --width 21 --depth 3 --repeat 20
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark.asgi import AsgiClient, running
+from benchmark.concurrency import REPO_ROOT
+
+
+def tree(width: int, depth: int, prefix: str = 'task') -> list[dict]:
+    if depth == 0:
+        return []
+    return [
+        {'description': f'{prefix} {i}', 'subtasks': tree(width, depth - 1, f'{prefix} {i}.')}
+        for i in range(width)
+    ]
+
+
+async def measure(args: argparse.Namespace) -> dict:
+    import main
+
+    main.db_engine.echo = False
+    async with running(main.app) as client:
+        return await measure_with(main, client, args)
+
+
+async def measure_with(main, client: AsgiClient, args: argparse.Namespace) -> dict:
+    from sqlalchemy import update
+
+    import model
+
+    project = await client.post_json('/api/project/create', {'name': 'bench'})
+    runbook = await client.post_json('/api/runbook/create', {
+        'project_uuid': project['created']['uuid'],
+        'name': 'bench',
+        'source': 'a',
+        'target': 'b',
+    })
+    runbook_uuid = runbook['created']['uuid']
+    imported = await client.post_json('/api/task/structure-import-bulk', {
+        'runbook_uuid': runbook_uuid,
+        'tasks': [{'description': 'root', 'subtasks': tree(args.width, args.depth)}],
+    })
+    # the import chains siblings through dependencies, and every TaskDto embeds
+    # its dependency with its own, so keeping them would make payloads quadratic
+    with main.db_engine.begin() as connection:
+        connection.execute(update(model.Task).values(depends_on_task_uuid=None))
+
+    requests = {
+        'get': ('/api/task/get', {'uuid': imported['root_uuids'][0]}),
+        'list-flat': ('/api/task/list', {'runbook_uuid': runbook_uuid, 'flat': True}),
+    }
+    results = {}
+    for name, (path, payload) in requests.items():
+        samples = []
+        body = b''
+        # one untimed call first, so get is served from the read cache
+        for _ in range(args.repeat + 1):
+            started = time.perf_counter()
+            status, body = await client.post(path, payload)
+            samples.append(time.perf_counter() - started)
+            if status != 200:
+                raise RuntimeError(f'{path} returned {status}: {body[:200]!r}')
+        results[name] = {
+            'median_ms': statistics.median(samples[1:]) * 1000,
+            'bytes': len(body),
+            # uuids differ between runs, so compare the shape of the payloads
+            'shape': hashlib.sha1(json.dumps(shape(json.loads(body)), sort_keys=True).encode()).hexdigest(),
+        }
+    return {'fast_responses': main.settings.fast_responses, 'tasks': imported['imported'], 'results': results}
+
+
+def shape(value):
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items() if key not in ('uuid', 'runbook_uuid')}
+    if isinstance(value, list):
+        return sorted((shape(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    return value
+
+
+def run_mode(fast_responses: bool, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env['WAVERUNNER_DATABASE_URL'] = f'sqlite:///{tmp}/bench.db'
+        env['WAVERUNNER_FAST_RESPONSES'] = str(fast_responses)
+        command = [
+            sys.executable, '-m', 'benchmark.serialization', '--child',
+            '--width', str(args.width), '--depth', str(args.depth), '--repeat', str(args.repeat),
+        ]
+        output = subprocess.run(command, env=env, cwd=REPO_ROOT, check=True, capture_output=True, text=True)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=21)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args))))
+        return
+
+    standard, fast = run_mode(False, args), run_mode(True, args)
+    print(f'{fast["tasks"]} tasks')
+    print(f'{"request":<12}{"standard":>12}{"fast":>12}{"speedup":>10}{"bytes":>12}  same payload')
+    for name, before in standard['results'].items():
+        after = fast['results'][name]
+        print(
+            f'{name:<12}{before["median_ms"]:>10.1f}ms{after["median_ms"]:>10.1f}ms'
+            f'{before["median_ms"] / after["median_ms"]:>9.1f}x{after["bytes"]:>12}'
+            f'  {"yes" if before["shape"] == after["shape"] else "NO"}'
+        )
+
+
+if __name__ == '__main__':
+    main()
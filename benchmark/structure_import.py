@@ -0,0 +1,106 @@
+"""
+Structure import benchmark on a generated tree (default: 50k tasks).
+
+Compares the recursive ORM import (legacy), the flattened executemany
+import (bulk) and the NDJSON streamed import (stream). Every mode runs in its
+own interpreter against a fresh database so peak RSS is comparable:
+
+    python -m benchmark.structure_import --width 37 --depth 3
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Iterator
+
+from benchmark.concurrency import REPO_ROOT
+
+
+def tree(width: int, depth: int) -> list[dict]:
+    if depth == 0:
+        return []
+    return [{'description': f'task {depth}.{i}', 'subtasks': tree(width, depth - 1)} for i in range(width)]
+
+
+def ndjson_tree(width: int, depth: int, level: int = 0) -> Iterator[bytes]:
+    if level == depth:
+        return
+    for i in range(width):
+        yield json.dumps({'description': f'task {depth - level}.{i}', 'depth': level}).encode()
+        yield from ndjson_tree(width, depth, level + 1)
+
+
+def measure(args: argparse.Namespace) -> dict:
+    from sqlalchemy import create_engine
+
+    import dto
+    import model
+    import service
+
+    engine = create_engine(args.database_url)
+    model.upgrade(engine)
+    project = service.ProjectService(engine).create(dto.ProjectCreateRequest(name='bench')).created
+    runbook = service.RunbookService(engine).create(dto.RunbookCreateRequest(
+        project_uuid=project.uuid, name='bench', source='a', target='b',
+    )).created
+    tasks = service.TaskService(engine)
+
+    started = time.perf_counter()
+    if args.mode == 'stream':
+        imported = tasks.structure_import_stream(runbook.uuid, ndjson_tree(args.width, args.depth)).imported
+    else:
+        request = dto.TaskStructureImportRequest.model_validate({
+            'runbook_uuid': runbook.uuid,
+            'tasks': tree(args.width, args.depth),
+        })
+        if args.mode == 'bulk':
+            imported = tasks.structure_import_bulk(request).imported
+        else:
+            tasks.structure_import(request)
+            imported = sum(args.width ** level for level in range(1, args.depth + 1))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'mode': args.mode,
+        'tasks': imported,
+        'seconds': elapsed,
+        'tasks_per_second': imported / elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='legacy,bulk,stream')
+    parser.add_argument('--width', type=int, default=37)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args)))
+        return
+
+    print(f'{"mode":<10}{"tasks":>8}{"seconds":>10}{"tasks/s":>10}{"peak rss":>12}')
+    for mode in args.modes.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            command = [
+                sys.executable, '-m', 'benchmark.structure_import', '--mode', mode,
+                '--width', str(args.width), '--depth', str(args.depth),
+                '--database-url', f'sqlite:///{tmp}/bench.db',
+            ]
+            output = subprocess.run(command, cwd=REPO_ROOT, env=os.environ, check=True, capture_output=True, text=True)
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(
+            f'{result["mode"]:<10}{result["tasks"]:>8}{result["seconds"]:>10.2f}'
+            f'{result["tasks_per_second"]:>10.0f}{result["peak_rss_mb"]:>10.1f}MB'
+        )
+
+
+if __name__ == '__main__':
+    main()
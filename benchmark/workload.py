@@ -0,0 +1,263 @@
+"""
+Endpoint benchmark: replays a weighted mix of task reads and status updates
+against the app and reports throughput, latency percentiles and (in process)
+SQL statements per request.
+
+By default the app runs in process on a fresh generated database. With --url
+the requests go to a running server instead, over a dataset written by
+benchmark.generator. Results can be saved as JSON and compared across commits:
+
+    python -m benchmark.workload --duration 20 --output before.json
+    python -m benchmark.workload --duration 20 --compare before.json
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import http.client
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Any, Callable, Optional
+
+from benchmark.asgi import percentile, running
+from benchmark.concurrency import REPO_ROOT
+from benchmark.generator import Dataset, generate
+
+
+DEFAULT_MIX = 'get=40,list-with-status=30,update-status=20,get-status-updates=10'
+
+# statements issued on behalf of the request being measured, in process only
+sql_statements: contextvars.ContextVar[Optional[list[int]]] = contextvars.ContextVar('sql_statements', default=None)
+
+
+def count_statement(*args):
+    counter = sql_statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class HttpClient:
+    """
+    Same interface as AsgiClient, for a server listening on a socket. Uses one
+    keep-alive connection per thread, so concurrent workers do not share one.
+    """
+
+    def __init__(self, url: str) -> None:
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.local = threading.local()
+
+    def _request(self, path: str, body: bytes) -> tuple[int, bytes]:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.host, self.port)
+        connection.request('POST', path, body, {'content-type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    async def post(self, path: str, payload: Any) -> tuple[int, bytes]:
+        return await asyncio.to_thread(self._request, path, json.dumps(payload).encode())
+
+
+def operations(dataset: Dataset, rng: random.Random) -> dict[str, Callable[[], tuple[str, dict]]]:
+    return {
+        'get': lambda: ('/api/task/get', {
+            'uuid': rng.choice(dataset.task_uuids),
+            'max_subtasks_depth': 1,
+        }),
+        'list-with-status': lambda: ('/api/task/list-with-status', {
+            'runbook_uuid': rng.choice(dataset.runbook_uuids),
+        }),
+        'update-status': lambda: ('/api/task/update-status', {
+            'task_uuid': rng.choice(dataset.leaf_uuids),
+            'status': rng.choice(['IN_PROGRESS', 'COMPLETED', 'ERROR']),
+            'detail': 'benchmark',
+            'updated_by': 'benchmark',
+        }),
+        'get-status-updates': lambda: ('/api/task/get-status-updates', {
+            'task_uuid': rng.choice(dataset.leaf_uuids),
+        }),
+    }
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights: dict[str, int] = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+async def replay(client, dataset: Dataset, args: argparse.Namespace, count_sql: bool) -> dict:
+    rng = random.Random(args.seed)
+    ops = operations(dataset, rng)
+    weights = parse_mix(args.mix)
+    unknown = weights.keys() - ops.keys()
+    if unknown:
+        raise SystemExit(f'unknown operations in --mix: {", ".join(sorted(unknown))}')
+    names = list(weights)
+
+    latencies: dict[str, list[float]] = {name: [] for name in names}
+    statements: dict[str, list[int]] = {name: [] for name in names}
+    errors: dict[str, int] = dict.fromkeys(names, 0)
+    stop = asyncio.Event()
+
+    async def worker():
+        while not stop.is_set():
+            name = rng.choices(names, [weights[name] for name in names])[0]
+            path, payload = ops[name]()
+            counter = [0]
+            token = sql_statements.set(counter)
+            started = time.perf_counter()
+            try:
+                status, _ = await client.post(path, payload)
+            finally:
+                sql_statements.reset(token)
+            latencies[name].append(time.perf_counter() - started)
+            statements[name].append(counter[0])
+            if status != 200:
+                errors[name] += 1
+            # an inline-mode app never suspends, so yield explicitly
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*workers)
+    elapsed = time.perf_counter() - started
+
+    def summary(samples: list[float], sql: list[int], failed: int) -> dict:
+        return {
+            'requests': len(samples),
+            'errors': failed,
+            'throughput_rps': len(samples) / elapsed,
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p90_ms': percentile(samples, 90) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+            'max_ms': max(samples, default=0.0) * 1000,
+            'sql_per_request': sum(sql) / len(sql) if count_sql and sql else None,
+        }
+
+    results = {name: summary(latencies[name], statements[name], errors[name]) for name in names}
+    results['total'] = summary(
+        [sample for name in names for sample in latencies[name]],
+        [count for name in names for count in statements[name]],
+        sum(errors.values()),
+    )
+    return results
+
+
+async def run_in_process(args: argparse.Namespace) -> tuple[dict, dict]:
+    from sqlalchemy import event
+
+    import main
+
+    async with running(main.app) as client:
+        dataset = generate(
+            main.db_engine, args.projects, args.runbooks, args.width, args.depth, args.dependency_density, args.seed,
+        )
+        for engine in {main.db_engine, main.read_engine}:
+            event.listen(engine, 'before_cursor_execute', count_statement)
+        results = await replay(client, dataset, args, count_sql=True)
+    environment = {
+        'target': 'in-process',
+        'execution_mode': main.settings.execution_mode.value,
+        'database': main.db_engine.url.get_backend_name(),
+        'tasks': len(dataset.task_uuids),
+    }
+    return results, environment
+
+
+async def run_remote(args: argparse.Namespace) -> tuple[dict, dict]:
+    if not args.dataset:
+        raise SystemExit('--url needs a --dataset written by benchmark.generator')
+    with open(args.dataset) as f:
+        dataset = Dataset.from_dict(json.load(f))
+    results = await replay(HttpClient(args.url), dataset, args, count_sql=False)
+    return results, {'target': args.url, 'tasks': len(dataset.task_uuids)}
+
+
+def git_revision() -> dict:
+    def git(*command: str) -> str:
+        return subprocess.run(['git', *command], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def print_results(results: dict, baseline: Optional[dict] = None):
+    header = f'{"operation":<20}{"requests":>10}{"errors":>8}{"req/s":>10}{"p50":>10}{"p90":>10}{"p99":>10}{"sql/req":>9}'
+    print(header)
+    for name, result in results.items():
+        sql = result['sql_per_request']
+        print(
+            f'{name:<20}{result["requests"]:>10}{result["errors"]:>8}{result["throughput_rps"]:>10.1f}'
+            f'{result["p50_ms"]:>8.1f}ms{result["p90_ms"]:>8.1f}ms{result["p99_ms"]:>8.1f}ms'
+            f'{"-" if sql is None else format(sql, ".1f"):>9}'
+        )
+        before = (baseline or {}).get(name)
+        if before:
+            print(
+                f'{"  vs baseline":<38}{change(before["throughput_rps"], result["throughput_rps"]):>10}'
+                f'{change(before["p50_ms"], result["p50_ms"]):>10}{change(before["p90_ms"], result["p90_ms"]):>10}'
+                f'{change(before["p99_ms"], result["p99_ms"]):>10}'
+            )
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return '-'
+    return f'{(after - before) / before * 100:+.0f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='benchmark a running server, e.g. http://127.0.0.1:8080')
+    parser.add_argument('--dataset', help='dataset JSON from benchmark.generator, with --url')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation weights')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--projects', type=int, default=1)
+    parser.add_argument('--runbooks', type=int, default=2, help='runbooks per project')
+    parser.add_argument('--width', type=int, default=5)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--dependency-density', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare against')
+    args = parser.parse_args()
+
+    if args.url:
+        results, environment = asyncio.run(run_remote(args))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            # main reads its settings at import time
+            os.environ.setdefault('WAVERUNNER_DATABASE_URL', f'sqlite:///{tmp}/bench.db')
+            results, environment = asyncio.run(run_in_process(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'revision': git_revision(),
+                'environment': environment,
+                'arguments': vars(args),
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
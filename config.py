@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import os
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+ENV_PREFIX = 'WAVERUNNER_'
+
+
+class ExecutionMode(str, Enum):
+    INLINE = 'inline'
+    THREADPOOL = 'threadpool'
+
+
+class SqliteSynchronous(str, Enum):
+    OFF = 'OFF'
+    NORMAL = 'NORMAL'
+    FULL = 'FULL'
+
+
+class Settings(BaseModel):
+    # any SQLAlchemy URL; PostgreSQL needs a driver installed next to the
+    # requirements, e.g. postgresql+psycopg://... with psycopg
+    database_url: str = 'sqlite:///waverunner.db'
+    # optional replica for plain reads, e.g. a Postgres hot standby
+    read_database_url: Optional[str] = None
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    sqlite_wal: bool = True
+    sqlite_synchronous: SqliteSynchronous = SqliteSynchronous.NORMAL
+    sqlite_busy_timeout_ms: int = 5000
+    execution_mode: ExecutionMode = ExecutionMode.THREADPOOL
+    db_max_concurrency: int = 4
+    cache_max_entries: int = 10000
+    # large task reads skip response validation and render with pydantic-core
+    fast_responses: bool = True
+    # log requests slower than this, with their SQL; off when unset
+    slow_request_ms: Optional[float] = None
+    # migrate on startup; off in workers of a multi-worker deployment, where
+    # gunicorn.conf.py does it once before starting them
+    prepare_database: bool = True
+    # run the hot queries once before reporting ready
+    warm_up: bool = True
+    # gunicorn workers, one per CPU when unset
+    workers: Optional[int] = None
+    # share cache invalidations and status events with other workers
+    change_feed: bool = False
+    change_poll_interval_ms: float = 100
+
+    @staticmethod
+    def from_env() -> Settings:
+        values = {}
+        for name in Settings.model_fields:
+            env_name = ENV_PREFIX + name.upper()
+            if env_name in os.environ:
+                values[name] = os.environ[env_name]
+        return Settings(**values)
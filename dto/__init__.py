@@ -2,20 +2,32 @@ from .project import \
     ProjectDto,\
     ProjectGetRequest, ProjectGetResponse,\
     ProjectCreateRequest, ProjectCreateResponse,\
-    ProjectListRequest, ProjectListResponse
+    ProjectListRequest, ProjectListResponse,\
+    ProjectSummaryRequest, ProjectSummaryResponse, RunbookSummaryDto
 
 from .runbook import \
     RunbookDto,\
     RunbookCreateRequest, RunbookCreateResponse, \
     RunbookGetRequest, RunbookGetResponse,\
-    RunbookListRequest, RunbookListResponse
+    RunbookListRequest, RunbookListResponse,\
+    RunbookCloneRequest, RunbookCloneResponse,\
+    RunbookPlanRequest, RunbookPlanResponse,\
+    RunbookExportRequest, RunbookExportLineDto
 
 from .task import \
     TaskDto, TaskInDto, TaskWithStatusDto, TaskStatusUpdateDto, \
     TaskCreateResponse, TaskCreateRequest,\
-    TaskGetRequest, TaskGetResponse, \
+    TaskGetRequest, TaskGetResponse, TaskProgressDto, \
     TaskListRequest, TaskListResponse, \
     TaskListWithStatusRequest, TaskListWithStatusResponse, \
     TaskGetStatusUpdatesRequest, TaskGetStatusUpdatesResponse, \
+    TaskCompactStatusHistoryRequest, TaskCompactStatusHistoryResponse, \
     TaskUpdateStatusRequest, TaskUpdateStatusResponse,\
-    TaskStructureImportRequest, TaskStructureImportResponse
+    TaskUpdateStatusBatchRequest, TaskUpdateStatusBatchResponse, \
+    TaskStructureImportRequest, TaskStructureImportResponse, \
+    TaskImportLineDto, TaskStatusExportLineDto, TaskBulkImportResponse, \
+    TaskRebuildSubtaskCountersRequest, TaskRebuildSubtaskCountersResponse, \
+    TaskStatusEventDto, TaskStatusEventsRequest, TaskStatusEventsResponse, \
+    TaskSearchRequest, TaskSearchHitDto, TaskSearchResponse
+
+from .cache import CacheStatsRequest, CacheStatsResponse
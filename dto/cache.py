@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+
+
+class CacheStatsRequest(BaseModel):
+    pass
+
+
+class CacheStatsResponse(BaseModel):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    stale: int
+    evictions: int
@@ -1,7 +1,13 @@
 from __future__ import annotations
-from pydantic import BaseModel
+
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
 
 import model
+from .runbook import RunbookDto
+from .task import TaskProgressDto
 
 
 class ProjectDto(BaseModel):
@@ -33,8 +39,27 @@ class ProjectCreateResponse(BaseModel):
 
 
 class ProjectListRequest(BaseModel):
-    pass
+    page_size: Optional[int] = Field(default=None, gt=0)
+    cursor: Optional[str] = None
 
 
 class ProjectListResponse(BaseModel):
     projects: list[ProjectDto]
+    next_cursor: Optional[str] = None
+
+
+class ProjectSummaryRequest(BaseModel):
+    uuid: str
+
+
+class RunbookSummaryDto(BaseModel):
+    runbook: RunbookDto
+    # leaf tasks by status, as in the progress of a task
+    progress: TaskProgressDto
+    # time of the latest status update to any of its tasks
+    last_activity_at: Optional[datetime.datetime] = None
+
+
+class ProjectSummaryResponse(BaseModel):
+    project: ProjectDto
+    runbooks: list[RunbookSummaryDto]
@@ -1,5 +1,8 @@
 from __future__ import annotations
-from pydantic import BaseModel
+
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
 
 import model
 
@@ -35,10 +38,13 @@ class RunbookCreateResponse(BaseModel):
 
 class RunbookListRequest(BaseModel):
     project_uuid: str
+    page_size: Optional[int] = Field(default=None, gt=0)
+    cursor: Optional[str] = None
 
 
 class RunbookListResponse(BaseModel):
     runbooks: list[RunbookDto]
+    next_cursor: Optional[str] = None
 
 
 class RunbookGetRequest(BaseModel):
@@ -47,3 +53,50 @@ class RunbookGetRequest(BaseModel):
 
 class RunbookGetResponse(BaseModel):
     runbook: RunbookDto
+
+
+class RunbookCloneRequest(BaseModel):
+    uuid: str
+    # the clone keeps the template's project, name, source and target unless given
+    project_uuid: Optional[str] = None
+    name: Optional[str] = None
+    source: Optional[str] = None
+    target: Optional[str] = None
+
+
+class RunbookCloneResponse(BaseModel):
+    created: RunbookDto
+    tasks: int
+
+
+class RunbookPlanRequest(BaseModel):
+    uuid: str
+    include_order: bool = True
+    include_critical_path: bool = True
+
+
+class RunbookPlanResponse(BaseModel):
+    # tasks without subtasks that are not started and whose dependencies,
+    # and those of all of their ancestors, are completed
+    ready: list[str]
+    # every task after its parent and its dependency
+    order: Optional[list[str]] = None
+    # longest chain of not completed tasks that must run one after the other
+    critical_path: Optional[list[str]] = None
+    # tasks left out of the order because their dependencies form a cycle
+    cyclic: list[str]
+
+
+class RunbookExportRequest(BaseModel):
+    uuid: str
+    include_history: bool = False
+    gzip: bool = False
+
+
+class RunbookExportLineDto(BaseModel):
+    type: Literal['runbook'] = 'runbook'
+    uuid: str
+    project_uuid: str
+    name: str
+    source: str
+    target: str
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 import model
 
@@ -18,8 +18,7 @@ class TaskStatusUpdateDto(BaseModel):
 
     @staticmethod
     def from_model(m: model.TaskStatusUpdate) -> TaskStatusUpdateDto:
-        print(m.updated_at)
-        return TaskStatusUpdateDto(
+        return TaskStatusUpdateDto.model_construct(
             uuid=m.uuid,
             task_uuid=m.task_uuid,
             status=m.status,
@@ -42,12 +41,20 @@ class TaskWithStatusDto(BaseModel):
     last_status: Optional[TaskStatusUpdateDto] = None
 
     @staticmethod
-    def from_model(m: model.Task, status: model.TaskStatusUpdate) -> TaskWithStatusDto:
-        return TaskWithStatusDto(
+    def from_model(
+            m: model.Task,
+            status: Optional[model.TaskStatusUpdate],
+            depends_on: Optional[TaskDto] = None,
+    ) -> TaskWithStatusDto:
+        """
+        depends_on is passed in already built, so listing many tasks does not
+        lazy load each dependency on its own.
+        """
+        return TaskWithStatusDto.model_construct(
             uuid=m.uuid,
             description=m.description,
             runbook_uuid=m.runbook_uuid,
-            depends_on=m.dependency and TaskDto.from_model(m.dependency, max_subtask_depth=0),
+            depends_on=depends_on,
             last_status=status and TaskStatusUpdateDto.from_model(status),
         )
 
@@ -62,13 +69,15 @@ class TaskDto(BaseModel):
 
     @staticmethod
     def from_model(m: model.Task, max_subtask_depth: Optional[int] = None) -> TaskDto:
+        # built from rows the database already constrains, so models are
+        # constructed without validation (and subtasks must be a list)
         if max_subtask_depth is not None:
-            subtasks = map(
-                lambda task: TaskDto.from_model(task, max_subtask_depth - 1), m.subtasks
-            ) if max_subtask_depth > 0 else []
+            subtasks = [
+                TaskDto.from_model(task, max_subtask_depth - 1) for task in m.subtasks
+            ] if max_subtask_depth > 0 else []
         else:
-            subtasks = map(TaskDto.from_model, m.subtasks)
-        return TaskDto(
+            subtasks = [TaskDto.from_model(task) for task in m.subtasks]
+        return TaskDto.model_construct(
             uuid=m.uuid,
             description=m.description,
             subtasks=subtasks,
@@ -95,8 +104,30 @@ class TaskGetRequest(BaseModel):
     calculate_progress: bool = False
 
 
+class TaskProgressDto(BaseModel):
+    leaves: int
+    not_started: int
+    in_progress: int
+    completed: int
+    error: int
+    percent_complete: float
+
+    @staticmethod
+    def from_counts(counts: dict[model.TaskStatus, int]) -> TaskProgressDto:
+        leaves = sum(counts.values())
+        return TaskProgressDto(
+            leaves=leaves,
+            not_started=counts[model.TaskStatus.NOT_STARTED],
+            in_progress=counts[model.TaskStatus.IN_PROGRESS],
+            completed=counts[model.TaskStatus.COMPLETED],
+            error=counts[model.TaskStatus.ERROR],
+            percent_complete=100 * counts[model.TaskStatus.COMPLETED] / leaves if leaves else 0.0,
+        )
+
+
 class TaskGetResponse(BaseModel):
     task: TaskDto
+    progress: Optional[TaskProgressDto] = None
 
 
 class TaskStructureImportRequest(BaseModel):
@@ -108,22 +139,63 @@ class TaskStructureImportResponse(BaseModel):
     tasks: list[TaskDto]
 
 
+class TaskImportLineDto(BaseModel):
+    type: Literal['task'] = 'task'
+    description: str
+    depth: int = Field(default=0, ge=0)
+    key: Optional[str] = None
+    depends_on: Optional[str] = None
+
+
+class TaskStatusExportLineDto(BaseModel):
+    type: Literal['status'] = 'status'
+    # key of the task line
+    task: str
+    uuid: str
+    status: model.TaskStatus
+    detail: str
+    updated_at: datetime.datetime
+    updated_by: Optional[str] = None
+
+
+class TaskBulkImportResponse(BaseModel):
+    imported: int
+    root_uuids: list[str]
+
+
 class TaskListRequest(BaseModel):
     runbook_uuid: str
     flat: bool = False
+    page_size: Optional[int] = Field(default=None, gt=0)
+    cursor: Optional[str] = None
 
 
 class TaskListResponse(BaseModel):
     tasks: list[TaskDto]
+    next_cursor: Optional[str] = None
 
 
 class TaskGetStatusUpdatesRequest(BaseModel):
     task_uuid: str
-    limit: int = 10
+    limit: int = Field(default=10, gt=0)
+    cursor: Optional[str] = None
 
 
 class TaskGetStatusUpdatesResponse(BaseModel):
     updates: list[TaskStatusUpdateDto]
+    next_cursor: Optional[str] = None
+
+
+class TaskCompactStatusHistoryRequest(BaseModel):
+    runbook_uuid: Optional[str] = None
+    # besides finished runbooks, also archive older updates of any runbook
+    older_than_days: Optional[float] = Field(default=None, ge=0)
+    batch_size: int = Field(default=5000, gt=0)
+
+
+class TaskCompactStatusHistoryResponse(BaseModel):
+    archived: int
+    finished_runbooks: int
 
 
 class TaskUpdateStatusRequest(BaseModel):
@@ -137,10 +209,70 @@ class TaskUpdateStatusResponse(BaseModel):
     update: TaskStatusUpdateDto
 
 
+class TaskUpdateStatusBatchRequest(BaseModel):
+    updates: list[TaskUpdateStatusRequest]
+
+
+class TaskUpdateStatusBatchResponse(BaseModel):
+    updates: list[TaskStatusUpdateDto]
+    rollups: list[TaskStatusUpdateDto]
+
+
 class TaskListWithStatusRequest(BaseModel):
     runbook_uuid: Optional[str] = None
     parent_task_uuid: Optional[str] = None
+    page_size: Optional[int] = Field(default=None, gt=0)
+    cursor: Optional[str] = None
 
 
 class TaskListWithStatusResponse(BaseModel):
     tasks: list[TaskWithStatusDto]
+    next_cursor: Optional[str] = None
+
+
+class TaskRebuildSubtaskCountersRequest(BaseModel):
+    runbook_uuid: Optional[str] = None
+    verify_only: bool = False
+
+
+class TaskRebuildSubtaskCountersResponse(BaseModel):
+    drifted: int
+
+
+class TaskStatusEventDto(BaseModel):
+    runbook_uuid: str
+    update: TaskStatusUpdateDto
+    cursor: str
+
+
+class TaskStatusEventsRequest(BaseModel):
+    runbook_uuid: str
+    task_uuid: Optional[str] = None
+    cursor: Optional[str] = None
+    limit: int = Field(default=500, gt=0)
+
+
+class TaskStatusEventsResponse(BaseModel):
+    events: list[TaskStatusEventDto]
+    next_cursor: Optional[str] = None
+
+
+class TaskSearchRequest(BaseModel):
+    # plain words, all of which must match; the last one also as a prefix
+    query: str = Field(min_length=1)
+    # narrows the search to a runbook, else to a project, else searches all
+    runbook_uuid: Optional[str] = None
+    project_uuid: Optional[str] = None
+    page_size: int = Field(default=20, gt=0, le=500)
+    cursor: Optional[str] = None
+
+
+class TaskSearchHitDto(BaseModel):
+    task: TaskWithStatusDto
+    # bm25 of the best matching description or status detail, lower is better
+    rank: float
+
+
+class TaskSearchResponse(BaseModel):
+    hits: list[TaskSearchHitDto]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,50 @@
+"""
+Multi-worker deployment: gunicorn with one uvicorn worker (uvloop) per CPU,
+or WAVERUNNER_WORKERS of them:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The database is prepared once in the master before any worker starts, and
+workers then skip that step. With more than one worker the workers keep
+their caches and status streams coherent through the change feed, and
+SQLite must be a file in WAL mode so they can read while one writes.
+"""
+import multiprocessing
+import os
+
+from config import ENV_PREFIX, Settings
+
+
+settings = Settings.from_env()
+
+bind = f'0.0.0.0:{os.environ.get("PORT", "8080")}'
+workers = settings.workers or multiprocessing.cpu_count()
+worker_class = 'uvicorn.workers.UvicornWorker'
+# engines, pools and caches are built in each worker after the fork
+preload_app = False
+
+
+def on_starting(server):
+    from sqlalchemy.engine import make_url
+
+    import model
+    import startup
+
+    for database_url in filter(None, (settings.database_url, settings.read_database_url)):
+        url = make_url(database_url)
+        if workers > 1 and url.get_backend_name() == 'sqlite':
+            if url.database in (None, '', ':memory:'):
+                raise RuntimeError('an in-memory SQLite database cannot be shared by several workers')
+            if not settings.sqlite_wal:
+                raise RuntimeError('several workers on SQLite need WAVERUNNER_SQLITE_WAL enabled')
+
+    db_engine, _ = model.create_engines(settings)
+    try:
+        startup.prepare_database(db_engine)
+    finally:
+        db_engine.dispose()
+
+    # workers inherit the environment of the master
+    os.environ[ENV_PREFIX + 'PREPARE_DATABASE'] = 'false'
+    if workers > 1:
+        os.environ[ENV_PREFIX + 'CHANGE_FEED'] = 'true'
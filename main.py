@@ -1,15 +1,65 @@
+import asyncio
+import contextlib
+import logging
 import time
+from typing import Any, Optional
 
-from fastapi import FastAPI, APIRouter
-from fastapi.staticfiles import StaticFiles
+import anyio.to_thread
+from fastapi import FastAPI, APIRouter, Header, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine
 
+import config
 import dto
 import service
 import model
-
-app = FastAPI()
+import startup
+
+logger = logging.getLogger('waverunner.startup')
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Prepares the database when this process is the one to, then serves
+    while warming up in the background. /api/health/ready answers 503 until
+    the warm-up is done, so instances only get traffic once warm.
+    """
+    if settings.prepare_database:
+        await anyio.to_thread.run_sync(startup.prepare_database, db_engine)
+    if change_feed is not None:
+        change_feed.start(task_service.service)
+    warming = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        warming.cancel()
+        if change_feed is not None:
+            change_feed.stop()
+
+
+async def warm_up():
+    try:
+        if settings.warm_up:
+            await anyio.to_thread.run_sync(
+                startup.warm_up,
+                [db_engine, read_engine],
+                project_service.service,
+                runbook_service.service,
+                task_service.service,
+                settings.db_pool_size,
+            )
+            await anyio.to_thread.run_sync(frontend.load)
+    except Exception:
+        logger.exception('warm-up failed, serving cold')
+    finally:
+        # warm-up only saves the first requests some latency, an instance
+        # that failed it can serve all the same
+        app.state.ready = True
+
+
+app = FastAPI(lifespan=lifespan)
+app.state.ready = False
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
@@ -17,79 +67,280 @@ app.add_middleware(
     allow_methods=['*'],
     allow_headers=['*'],
 )
-api = FastAPI()
 
-db_engine = create_engine("sqlite:///waverunner.db", echo=True)
-model.Base.metadata.create_all(db_engine)
+settings = config.Settings.from_env()
+
+api = FastAPI(default_response_class=service.ModelResponse if settings.fast_responses else JSONResponse)
+
+db_engine, read_engine = model.create_engines(settings)
+
+metrics = service.Metrics(
+    slow_request_seconds=settings.slow_request_ms / 1000 if settings.slow_request_ms is not None else None,
+)
+metrics.instrument(db_engine, read_engine)
+api.add_middleware(service.MetricsMiddleware, metrics=metrics)
+
+status_broker = service.StatusBroker()
+read_cache = service.ReadCache(settings.cache_max_entries)
+planner = service.RunbookPlanner()
+change_feed = service.ChangeFeed(db_engine, settings.change_poll_interval_ms / 1000) if settings.change_feed else None
 
-project_service = service.ProjectService(db=db_engine)
-runbook_service = service.RunbookService(db=db_engine)
-task_service = service.TaskService(db=db_engine)
+frontend = service.StaticAssets('frontend_dist')
+
+db_limit = service.ConcurrencyLimit(settings.db_max_concurrency)
+project_service = service.AsyncService(service.ProjectService(db=db_engine, read_db=read_engine, cache=read_cache), settings.execution_mode, db_limit)
+runbook_service = service.AsyncService(service.RunbookService(db=db_engine, read_db=read_engine, cache=read_cache, planner=planner), settings.execution_mode, db_limit)
+task_service = service.AsyncService(service.TaskService(db=db_engine, read_db=read_engine, broker=status_broker, cache=read_cache, planner=planner, changes=change_feed), settings.execution_mode, db_limit)
 
 app.mount("/api", api)
-app.mount("/", StaticFiles(directory="frontend_dist", html=True), name="frontend")
+app.mount("/", frontend, name="frontend")
+
+
+def respond(content: Any, response: Optional[Response] = None, etag: Optional[str] = None) -> Any:
+    """
+    Large responses are returned as a ModelResponse, which FastAPI sends as
+    is; their routes declare the response_model for the schema. Otherwise
+    the etag goes on the response FastAPI injected into the route.
+    """
+    headers = {'etag': etag} if etag is not None else None
+    if settings.fast_responses:
+        return service.ModelResponse(content, headers=headers)
+    if headers is not None:
+        response.headers.update(headers)
+    return content
+
+
+def not_modified(etag: Optional[str], if_none_match: Optional[str]) -> Optional[Response]:
+    """
+    A 304 for a client that already has etag, before anything is loaded.
+    """
+    if etag is None or not if_none_match:
+        return None
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    if etag in tags or '*' in tags:
+        return Response(status_code=304, headers={'etag': etag})
+    return None
 
 
 @api.post('/project/get')
 async def project_get(request: dto.ProjectGetRequest) -> dto.ProjectGetResponse:
-    return project_service.get(request)
+    return await project_service.get(request)
 
 
 @api.post('/project/create')
 async def project_create(request: dto.ProjectCreateRequest) -> dto.ProjectCreateResponse:
-    return project_service.create(request)
+    return await project_service.create(request)
 
 
 @api.post('/project/list')
 async def project_list(request: dto.ProjectListRequest) -> dto.ProjectListResponse:
-    return project_service.list(request)
+    return await project_service.list(request)
+
+
+@api.post('/project/summary')
+async def project_summary(request: dto.ProjectSummaryRequest) -> dto.ProjectSummaryResponse:
+    return await project_service.summary(request)
 
 
 @api.post('/runbook/create')
 async def runbook_create(request: dto.RunbookCreateRequest) -> dto.RunbookCreateResponse:
-    return runbook_service.create(request)
+    return await runbook_service.create(request)
 
 
 @api.post('/runbook/list')
 async def runbook_list(request: dto.RunbookListRequest) -> dto.RunbookListResponse:
-    return runbook_service.list(request)
+    return await runbook_service.list(request)
 
 
 @api.post('/runbook/get')
 async def runbook_get(request: dto.RunbookGetRequest) -> dto.RunbookGetResponse:
-    return runbook_service.get(request)
+    return await runbook_service.get(request)
+
+
+@api.post('/runbook/clone')
+async def runbook_clone(request: dto.RunbookCloneRequest) -> dto.RunbookCloneResponse:
+    return await runbook_service.clone(request)
+
+
+@api.post('/runbook/plan')
+async def runbook_plan(request: dto.RunbookPlanRequest) -> dto.RunbookPlanResponse:
+    return await runbook_service.plan(request)
+
+
+@api.post('/runbook/export')
+async def runbook_export(request: dto.RunbookExportRequest) -> StreamingResponse:
+    """
+    Streams the runbook as NDJSON, which /task/structure-import-stream takes
+    back as it is.
+    """
+    export = await runbook_service.open_export(request)
+    filename = f'runbook-{request.uuid}.ndjson'
+    if request.gzip:
+        filename += '.gz'
+    return StreamingResponse(
+        export.chunks(),
+        media_type='application/gzip' if request.gzip else 'application/x-ndjson',
+        headers={'content-disposition': f'attachment; filename="{filename}"'},
+    )
 
 
 @api.post('/task/create')
 async def task_create(request: dto.TaskCreateRequest) -> dto.TaskCreateResponse:
-    return task_service.create(request)
+    return await task_service.create(request)
+
 
+@api.post('/task/get', response_model=dto.TaskGetResponse)
+async def task_get(
+        request: dto.TaskGetRequest, response: Response, if_none_match: Optional[str] = Header(None),
+) -> Response:
+    etag = await task_service.etag(request, task_uuid=request.uuid)
+    return not_modified(etag, if_none_match) or respond(await task_service.get(request), response, etag)
 
-@api.post('/task/get')
-async def task_get(request: dto.TaskGetRequest) -> dto.TaskGetResponse:
-    return task_service.get(request)
 
+@api.post('/task/list', response_model=dto.TaskListResponse)
+async def task_list(
+        request: dto.TaskListRequest, response: Response, if_none_match: Optional[str] = Header(None),
+) -> Response:
+    etag = await task_service.etag(request, runbook_uuid=request.runbook_uuid)
+    return not_modified(etag, if_none_match) or respond(await task_service.list(request), response, etag)
 
-@api.post('/task/list')
-async def task_list(request: dto.TaskListRequest) -> dto.TaskListResponse:
-    return task_service.list(request)
 
+@api.post('/task/list-with-status', response_model=dto.TaskListWithStatusResponse)
+async def task_list_with_status(
+        request: dto.TaskListWithStatusRequest, response: Response, if_none_match: Optional[str] = Header(None),
+) -> Response:
+    etag = await task_service.etag(request, runbook_uuid=request.runbook_uuid, task_uuid=request.parent_task_uuid)
+    return not_modified(etag, if_none_match) or respond(await task_service.list_with_status(request), response, etag)
 
-@api.post('/task/list-with-status')
-async def task_list_with_status(request: dto.TaskListWithStatusRequest) -> dto.TaskListWithStatusResponse:
-    return task_service.list_with_status(request)
+
+@api.post('/task/search', response_model=dto.TaskSearchResponse)
+async def task_search(request: dto.TaskSearchRequest) -> Response:
+    return respond(await task_service.search(request))
 
 
 @api.post('/task/get-status-updates')
 async def task_get_status_updates(request: dto.TaskGetStatusUpdatesRequest) -> dto.TaskGetStatusUpdatesResponse:
-    return task_service.get_status_updates(request)
+    return await task_service.get_status_updates(request)
 
 
-@api.post('/task/update-status')
-async def task_update_status(request: dto.TaskUpdateStatusRequest) -> dto.TaskUpdateStatusResponse:
-    return task_service.update_status(request)
+@api.post('/task/compact-status-history')
+async def task_compact_status_history(request: dto.TaskCompactStatusHistoryRequest) -> dto.TaskCompactStatusHistoryResponse:
+    return await task_service.compact_status_history(request)
 
 
-@api.post('/task/structure-import')
-async def task_structure_import(request: dto.TaskStructureImportRequest) -> dto.TaskStructureImportResponse:
-    return task_service.structure_import(request)
+@api.post('/task/update-status')
+async def task_update_status(request: dto.TaskUpdateStatusRequest) -> dto.TaskUpdateStatusResponse:
+    return await task_service.update_status(request)
+
+
+@api.post('/task/update-status-batch')
+async def task_update_status_batch(request: dto.TaskUpdateStatusBatchRequest) -> dto.TaskUpdateStatusBatchResponse:
+    return await task_service.update_status_batch(request)
+
+
+@api.post('/task/structure-import', response_model=dto.TaskStructureImportResponse)
+async def task_structure_import(request: dto.TaskStructureImportRequest) -> Response:
+    return respond(await task_service.structure_import(request))
+
+
+@api.post('/task/structure-import-bulk')
+async def task_structure_import_bulk(request: dto.TaskStructureImportRequest) -> dto.TaskBulkImportResponse:
+    return await task_service.structure_import_bulk(request)
+
+
+@api.post('/task/structure-import-stream')
+async def task_structure_import_stream(runbook_uuid: str, request: Request) -> dto.TaskBulkImportResponse:
+    """
+    Body is NDJSON, one TaskImportLineDto per line in pre-order. It is
+    received in full before the import's transaction starts.
+    """
+    with await service.spool(request.stream()) as body:
+        return await task_service.structure_import_stream(runbook_uuid, body)
+
+
+@api.post('/task/rebuild-subtask-counters')
+async def task_rebuild_subtask_counters(
+        request: dto.TaskRebuildSubtaskCountersRequest
+) -> dto.TaskRebuildSubtaskCountersResponse:
+    return await task_service.rebuild_subtask_counters(request)
+
+
+@api.post('/task/status-events')
+async def task_status_events(request: dto.TaskStatusEventsRequest) -> dto.TaskStatusEventsResponse:
+    return await task_service.status_events(request)
+
+
+@api.websocket('/task/status-stream')
+async def task_status_stream(
+        websocket: WebSocket,
+        runbook_uuid: str,
+        task_uuid: Optional[str] = None,
+        cursor: Optional[str] = None,
+):
+    """
+    Pushes every committed TaskStatusEventDto of the runbook (or of the subtree
+    of task_uuid), parent rollups included. Passing the cursor of the last
+    event received replays what was missed before going live. If the client
+    falls too far behind, the socket is closed with 1013 and it should
+    reconnect with its last cursor.
+    """
+    await websocket.accept()
+    subscription = status_broker.subscribe(runbook_uuid, task_uuid)
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        # subscribed before replaying, so nothing committed meanwhile is lost
+        replayed_up_to = None
+        while cursor is not None:
+            page = await task_service.status_events(dto.TaskStatusEventsRequest(
+                runbook_uuid=runbook_uuid, task_uuid=task_uuid, cursor=cursor,
+            ))
+            for event in page.events:
+                await websocket.send_text(event.model_dump_json())
+                replayed_up_to = (event.update.updated_at, event.update.uuid)
+            cursor = page.next_cursor
+
+        while True:
+            next_event = asyncio.create_task(subscription.get())
+            await asyncio.wait((next_event, receiver), return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                if receiver.result()['type'] == 'websocket.disconnect':
+                    return
+                # clients have nothing to say, ignore anything they send
+                receiver = asyncio.create_task(websocket.receive())
+                continue
+            event = next_event.result()
+            if event is None:
+                await websocket.close(code=1013)
+                return
+            if replayed_up_to and (event.update.updated_at, event.update.uuid) <= replayed_up_to:
+                continue
+            await websocket.send_text(event.model_dump_json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        status_broker.unsubscribe(subscription)
+
+
+@api.post('/cache/stats')
+async def cache_stats(request: dto.CacheStatsRequest) -> dto.CacheStatsResponse:
+    return read_cache.stats()
+
+
+@api.get('/health/live', response_class=PlainTextResponse)
+async def health_live() -> str:
+    return 'ok'
+
+
+@api.get('/health/ready', response_class=PlainTextResponse)
+async def health_ready(response: Response) -> str:
+    if not app.state.ready:
+        response.status_code = 503
+        return 'warming up'
+    return 'ok'
+
+
+@api.get('/metrics', response_class=PlainTextResponse)
+async def metrics_export() -> str:
+    return metrics.render()
@@ -1 +1,4 @@
-from .models import Base, Project, Runbook, Task, TaskStatus, TaskStatusUpdate
+from .models import Base, Project, Runbook, Task, TaskStatus, TaskStatusUpdate, TaskStatusArchive, Change, SUBTASK_COUNTERS, ROLLUP_UPDATED_BY
+from .search import task_search, create_task_search
+from .migrate import upgrade
+from .engine import create_engines
@@ -0,0 +1,50 @@
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import URL, make_url
+
+from config import Settings
+
+
+def create_engines(settings: Settings) -> tuple[Engine, Engine]:
+    """
+    Builds the engines for the configured storage profile and returns them as
+    (write engine, read engine). Without a read_database_url both are the
+    same engine.
+    """
+    db = _create_engine(settings.database_url, settings)
+    if not settings.read_database_url:
+        return db, db
+    return db, _create_engine(settings.read_database_url, settings)
+
+
+def _create_engine(database_url: str, settings: Settings) -> Engine:
+    url = make_url(database_url)
+    options = {}
+    if not _is_memory_sqlite(url):
+        # in-memory SQLite is a single connection, anything else gets a sized pool
+        options.update(pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow)
+    if url.get_backend_name() != 'sqlite':
+        options.update(pool_pre_ping=True)
+
+    engine = create_engine(url, echo=settings.db_echo, **options)
+    if url.get_backend_name() == 'sqlite':
+        event.listen(engine, 'connect', _sqlite_pragmas(settings))
+    return engine
+
+
+def _is_memory_sqlite(url: URL) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _sqlite_pragmas(settings: Settings):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # WAL lets readers proceed while a writer holds the database lock
+            if settings.sqlite_wal:
+                cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute(f'PRAGMA synchronous={settings.sqlite_synchronous.value}')
+            cursor.execute(f'PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}')
+        finally:
+            cursor.close()
+
+    return on_connect
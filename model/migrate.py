@@ -0,0 +1,30 @@
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from .models import Base
+from .search import create_task_search
+
+
+def upgrade(engine: Engine) -> list[str]:
+    """
+    Brings an existing database up to the current models in place: creates
+    missing tables, adds missing columns, creates missing indexes and, on
+    SQLite, the task search index (filled from existing rows). Returns
+    the added columns as "table.column" so callers can backfill them.
+    """
+    Base.metadata.create_all(engine)
+    added: list[str] = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+                added.append(f'{table.name}.{column.name}')
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        create_task_search(connection)
+    return added
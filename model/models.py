@@ -1,9 +1,9 @@
 import datetime
 from enum import Enum
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import ForeignKey, Index, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from typing import List
+from typing import List, Optional
 
 
 class Base(DeclarativeBase):
@@ -29,10 +29,18 @@ class Runbook(Base):
     source: Mapped[str]
     target: Mapped[str]
     project_uuid: Mapped[str] = mapped_column(ForeignKey("projects.uuid"))
+    # bumped in the transaction of every change to its tasks or their
+    # statuses; ETags of task reads derive from it
+    version: Mapped[int] = mapped_column(default=0, server_default='0')
 
     project: Mapped["Project"] = relationship(back_populates='runbooks')
     tasks: Mapped[List["Task"]] = relationship(back_populates='runbook')
 
+    __table_args__ = (
+        # runbooks of a project, paged by uuid
+        Index('ix_runbooks_project_uuid', 'project_uuid', 'uuid'),
+    )
+
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -41,15 +49,37 @@ class Task(Base):
     description: Mapped[str]
 
     runbook_uuid: Mapped[str] = mapped_column(ForeignKey("runbooks.uuid"))
-    parent_task_uuid: Mapped[str] = mapped_column(ForeignKey("tasks.uuid"))
-    depends_on_task_uuid: Mapped[str] = mapped_column(ForeignKey("tasks.uuid"))
-    last_status_uuid: Mapped[str]
+    parent_task_uuid: Mapped[Optional[str]] = mapped_column(ForeignKey("tasks.uuid"))
+    depends_on_task_uuid: Mapped[Optional[str]] = mapped_column(ForeignKey("tasks.uuid"))
+    last_status_uuid: Mapped[Optional[str]]
+
+    # materialized count of direct subtasks per status, kept up to date by
+    # delta on every subtask status transition (see StatusRollup)
+    subtasks_not_started: Mapped[int] = mapped_column(default=0, server_default='0')
+    subtasks_in_progress: Mapped[int] = mapped_column(default=0, server_default='0')
+    subtasks_completed: Mapped[int] = mapped_column(default=0, server_default='0')
+    subtasks_error: Mapped[int] = mapped_column(default=0, server_default='0')
 
     runbook: Mapped["Runbook"] = relationship(back_populates='tasks')
     parent: Mapped["Task"] = relationship(remote_side=uuid, backref='subtasks', foreign_keys=[parent_task_uuid])
     dependency: Mapped["Task"] = relationship(remote_side=uuid, backref='dependants', foreign_keys=[depends_on_task_uuid])
     status_updates: Mapped["TaskStatusUpdate"] = relationship(remote_side=uuid, back_populates='task')
 
+    __table_args__ = (
+        # root (parent NULL) or all tasks of a runbook, paged by uuid
+        Index('ix_tasks_runbook_uuid_parent', 'runbook_uuid', 'parent_task_uuid', 'uuid'),
+        # a runbook's tasks and root tasks in insertion order: on SQLite every
+        # index ends in the rowid, which pages of task lists are keyed on
+        Index('ix_tasks_runbook_uuid_rowid', 'runbook_uuid'),
+        Index('ix_tasks_runbook_uuid_parent_rowid', 'runbook_uuid', 'parent_task_uuid'),
+        # subtasks of a task; rows come back in insertion order
+        Index('ix_tasks_parent_task_uuid', 'parent_task_uuid'),
+        Index('ix_tasks_depends_on_task_uuid', 'depends_on_task_uuid'),
+    )
+
+    def subtask_counts(self) -> dict["TaskStatus", int]:
+        return {status: getattr(self, column) for status, column in SUBTASK_COUNTERS.items()}
+
 
 class TaskStatus(str, Enum):
     NOT_STARTED = 'NOT_STARTED'
@@ -58,6 +88,18 @@ class TaskStatus(str, Enum):
     ERROR = 'ERROR'
 
 
+# updated_by of the statuses StatusRollup writes for parent tasks
+ROLLUP_UPDATED_BY = 'Subtask change'
+
+
+SUBTASK_COUNTERS: dict[TaskStatus, str] = {
+    TaskStatus.NOT_STARTED: 'subtasks_not_started',
+    TaskStatus.IN_PROGRESS: 'subtasks_in_progress',
+    TaskStatus.COMPLETED: 'subtasks_completed',
+    TaskStatus.ERROR: 'subtasks_error',
+}
+
+
 class TaskStatusUpdate(Base):
     __tablename__ = "task_status"
 
@@ -66,6 +108,51 @@ class TaskStatusUpdate(Base):
     status: Mapped[TaskStatus] = mapped_column(nullable=False)
     detail: Mapped[str]
     updated_at: Mapped[datetime.datetime] = mapped_column(nullable=False, server_default=func.now())
-    updated_by: Mapped[str]
+    updated_by: Mapped[Optional[str]]
 
     task: Mapped["Task"] = relationship(back_populates='status_updates')
+
+    __table_args__ = (
+        # status history of a task, newest first
+        Index('ix_task_status_task_uuid_updated_at', 'task_uuid', 'updated_at', 'uuid'),
+    )
+
+
+class TaskStatusArchive(Base):
+    """
+    Status updates moved out of task_status by the compaction job. Never
+    holds the last status of a task, so for every task its archived updates
+    are older than the ones left in task_status.
+    """
+    __tablename__ = "task_status_archive"
+
+    # clustered by task and time, the only way the archive is read
+    task_uuid: Mapped[str] = mapped_column(primary_key=True)
+    updated_at: Mapped[datetime.datetime] = mapped_column(primary_key=True)
+    uuid: Mapped[str] = mapped_column(primary_key=True)
+    status: Mapped[TaskStatus] = mapped_column(nullable=False)
+    detail: Mapped[str]
+    updated_by: Mapped[Optional[str]]
+
+    __table_args__ = {'sqlite_with_rowid': False}
+
+
+class Change(Base):
+    """
+    What each committed write changed, for the other workers sharing the
+    database to replay on their in-process state (see service.ChangeFeed).
+    Written in the same transaction as the change itself and pruned after a
+    while.
+    """
+    __tablename__ = "changes"
+
+    # AUTOINCREMENT so a seq is never reused once the newest rows are pruned
+    seq: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # the worker that made the change, which has already applied it
+    origin: Mapped[str]
+    kind: Mapped[str]
+    # JSON, shape depends on kind
+    payload: Mapped[str]
+    created_at: Mapped[datetime.datetime] = mapped_column(nullable=False, server_default=func.now())
+
+    __table_args__ = {'sqlite_autoincrement': True}
@@ -0,0 +1,85 @@
+from sqlalchemy import Column, Connection, Float, Integer, MetaData, String, Table, text
+
+from .models import ROLLUP_UPDATED_BY
+
+
+# The FTS5 index behind task search, SQLite only. Not part of Base.metadata:
+# create_all cannot create virtual tables, create_task_search does.
+#
+# One row per task description and one per explicit status detail, so
+# writes only ever append and need no read of what is indexed already.
+# Rollup statuses are left out, their generated details would match
+# "completed" or "subtasks" on every parent task.
+task_search = Table(
+    'task_search', MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('content', String),
+    Column('task_uuid', String),
+    Column('runbook_uuid', String),
+    # hidden FTS5 column, the bm25 score of a match (lower is better)
+    Column('rank', Float),
+)
+
+_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5(
+        content,
+        task_uuid UNINDEXED,
+        runbook_uuid UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    # kept in sync by triggers, so every way tasks and statuses are written
+    # (ORM, bulk and streamed imports, clones) is covered
+    """
+    CREATE TRIGGER IF NOT EXISTS task_search_tasks_insert AFTER INSERT ON tasks
+    BEGIN
+        INSERT INTO task_search (content, task_uuid, runbook_uuid)
+        VALUES (new.description, new.uuid, new.runbook_uuid);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS task_search_task_status_insert AFTER INSERT ON task_status
+    WHEN new.updated_by IS NOT '{ROLLUP_UPDATED_BY}' AND new.detail != ''
+    BEGIN
+        INSERT INTO task_search (content, task_uuid, runbook_uuid)
+        SELECT new.detail, uuid, runbook_uuid FROM tasks WHERE uuid = new.task_uuid;
+    END
+    """,
+)
+
+_BACKFILL = (
+    """
+    INSERT INTO task_search (content, task_uuid, runbook_uuid)
+    SELECT description, uuid, runbook_uuid FROM tasks
+    """,
+    f"""
+    INSERT INTO task_search (content, task_uuid, runbook_uuid)
+    SELECT s.detail, t.uuid, t.runbook_uuid
+    FROM (
+        SELECT task_uuid, detail, updated_by FROM task_status
+        UNION ALL
+        SELECT task_uuid, detail, updated_by FROM task_status_archive
+    ) AS s
+    JOIN tasks AS t ON t.uuid = s.task_uuid
+    WHERE s.updated_by IS NOT '{ROLLUP_UPDATED_BY}' AND s.detail != ''
+    """,
+)
+
+
+def create_task_search(connection: Connection) -> bool:
+    """
+    Creates the search index and its triggers if missing, indexing the
+    existing tasks and statuses when the index is new. Returns whether it
+    was created; always False on anything but SQLite.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    exists = connection.scalar(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task_search'"))
+    for ddl in _DDL:
+        connection.execute(text(ddl))
+    if exists:
+        return False
+    for backfill in _BACKFILL:
+        connection.execute(text(backfill))
+    return True
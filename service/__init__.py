@@ -1,3 +1,15 @@
 from .project import ProjectService
 from .runbook import RunbookService
 from .task import TaskService
+from .offload import AsyncService, ConcurrencyLimit
+from .task_import import TaskStreamImport, spool
+from .broker import StatusBroker, StatusEvent, Subscription
+from .changes import Change, ChangeFeed
+from .task_status import StatusRollup
+from .progress import ProgressCache
+from .cache import ReadCache, RunbookVersions
+from .metrics import Metrics, MetricsMiddleware
+from .planner import PlanIndex, RunbookPlanner
+from .runbook_export import RunbookExport
+from .response import ModelResponse
+from .static import StaticAssets
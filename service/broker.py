@@ -0,0 +1,114 @@
+import asyncio
+from typing import Optional
+
+import dto
+
+
+class StatusEvent:
+    __slots__ = ('runbook_uuid', 'task_path', 'event')
+
+    def __init__(self, runbook_uuid: str, task_path: list[str], event: dto.TaskStatusEventDto) -> None:
+        self.runbook_uuid = runbook_uuid
+        # the updated task followed by all of its ancestors
+        self.task_path = task_path
+        self.event = event
+
+
+class Subscription:
+    """
+    A subscriber's view of the broker: a bounded queue of events for one
+    runbook, optionally restricted to the subtree of one task. A subscriber
+    that falls queue_size events behind is marked overflowed and receives no
+    more events; it is expected to reconnect and resume from its last cursor.
+    """
+
+    def __init__(self, runbook_uuid: str, task_uuid: Optional[str], queue_size: int) -> None:
+        self.runbook_uuid = runbook_uuid
+        self.task_uuid = task_uuid
+        self.queue: asyncio.Queue[Optional[dto.TaskStatusEventDto]] = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def matches(self, event: StatusEvent) -> bool:
+        return self.task_uuid is None or self.task_uuid in event.task_path
+
+    def put(self, event: StatusEvent):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event.event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.close()
+
+    def close(self):
+        # wakes up the consumer; None marks the end of the stream
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[dto.TaskStatusEventDto]:
+        return await self.queue.get()
+
+
+class StatusBroker:
+    """
+    In-process fan-out of committed task status updates to subscribers.
+
+    Subscribers are indexed by runbook, so an idle subscriber costs one queue
+    and publishing only touches the subscribers of the affected runbook.
+    publish may be called from any thread; delivery happens on the event loop.
+    """
+
+    def __init__(self, queue_size: int = 1000) -> None:
+        self.queue_size = queue_size
+        self.subscriptions: dict[str, set[Subscription]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, runbook_uuid: str, task_uuid: Optional[str] = None) -> Subscription:
+        self.loop = asyncio.get_running_loop()
+        subscription = Subscription(runbook_uuid, task_uuid, self.queue_size)
+        self.subscriptions.setdefault(runbook_uuid, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self.subscriptions.get(subscription.runbook_uuid)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.runbook_uuid]
+
+    def wants(self, runbook_uuid: str) -> bool:
+        return runbook_uuid in self.subscriptions
+
+    def publish(self, events: list[StatusEvent]):
+        if self.loop is None or self.loop.is_closed() or not events:
+            return
+        self.loop.call_soon_threadsafe(self._dispatch, events)
+
+    def close_all(self):
+        """
+        Ends every stream, e.g. when events may have been missed; subscribers
+        resume from their last cursor.
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._close_all)
+
+    def subscriber_count(self) -> int:
+        return sum(map(len, self.subscriptions.values()))
+
+    def _dispatch(self, events: list[StatusEvent]):
+        for event in events:
+            for subscription in tuple(self.subscriptions.get(event.runbook_uuid, ())):
+                if subscription.matches(event):
+                    subscription.put(event)
+
+    def _close_all(self):
+        for subscriptions in tuple(self.subscriptions.values()):
+            for subscription in tuple(subscriptions):
+                if not subscription.overflowed:
+                    subscription.overflowed = True
+                    subscription.close()
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+import dto
+
+
+T = TypeVar('T')
+
+
+class RunbookVersions:
+    """
+    Change counter per runbook, bumped whenever its tasks or their statuses
+    change. Anything derived from a runbook's tasks is valid for as long as
+    the runbook's version is unchanged.
+    """
+
+    def __init__(self) -> None:
+        self.versions: dict[str, int] = {}
+        # total number of bumps, across all runbooks
+        self.changes = 0
+        # persisted runbooks.version each runbook was last seen at, see observe()
+        self.persisted: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, runbook_uuid: str) -> int:
+        return self.versions.get(runbook_uuid, 0)
+
+    def observed(self, runbook_uuid: str, persisted_version: int) -> bool:
+        """
+        Whether the runbook was last seen at persisted_version, so whatever
+        is cached for it already reflects that version: this process either
+        made or was told about every change up to it.
+        """
+        return self.persisted.get(runbook_uuid) == persisted_version
+
+    def observe(self, runbook_uuid: str, persisted_version: int):
+        """
+        Records the runbook as seen at persisted_version. Callers first drop
+        anything cached for it that may predate that version.
+        """
+        with self.lock:
+            self.persisted[runbook_uuid] = persisted_version
+
+    def bump(self, *runbook_uuids: str):
+        with self.lock:
+            for runbook_uuid in runbook_uuids:
+                self.versions[runbook_uuid] = self.versions.get(runbook_uuid, 0) + 1
+            self.changes += 1
+
+
+class _Entry:
+    __slots__ = ('value', 'runbook_uuid', 'version')
+
+    def __init__(self, value: Any, runbook_uuid: Optional[str], version: int) -> None:
+        self.value = value
+        self.runbook_uuid = runbook_uuid
+        self.version = version
+
+
+class ReadCache:
+    """
+    Bounded LRU read-through cache for service reads, keyed by uuid.
+
+    Entries derived from a runbook's tasks remember the runbook version they
+    were loaded at and are treated as misses once it moves on. Entries without
+    a runbook (projects, runbooks) never go stale, as those are immutable.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self.versions = RunbookVersions()
+        self.entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get_or_load(self, key: Hashable, load: Callable[[], T], runbook_of: Optional[Callable[[T], str]] = None) -> T:
+        """
+        Returns the cached value for key, or calls load() and caches its
+        result. runbook_of tells which runbook a loaded value derives from.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry.runbook_uuid is None or entry.version == self.versions.get(entry.runbook_uuid):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                del self.entries[key]
+                self.stale += 1
+            self.misses += 1
+            changes = self.versions.changes
+
+        value = load()
+        runbook_uuid = runbook_of(value) if runbook_of is not None else None
+
+        with self.lock:
+            if runbook_uuid is not None and self.versions.changes != changes:
+                # something changed while loading, the value may predate it
+                return value
+            version = self.versions.get(runbook_uuid) if runbook_uuid is not None else 0
+            self.entries[key] = _Entry(value, runbook_uuid, version)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self.lock:
+            # entries loaded meanwhile must not be kept either
+            self.versions.bump()
+            self.entries.clear()
+
+    def stats(self) -> dto.CacheStatsResponse:
+        return dto.CacheStatsResponse(
+            entries=len(self.entries),
+            max_entries=self.max_entries,
+            hits=self.hits,
+            misses=self.misses,
+            stale=self.stale,
+            evictions=self.evictions,
+        )
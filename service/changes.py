@@ -0,0 +1,161 @@
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Optional, Protocol
+
+from sqlalchemy import Engine, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+import model
+
+
+logger = logging.getLogger('waverunner.changes')
+
+
+class Change:
+    __slots__ = ('kind', 'payload')
+
+    def __init__(self, kind: str, payload: dict[str, Any]) -> None:
+        self.kind = kind
+        self.payload = payload
+
+
+class ChangeListener(Protocol):
+
+    def apply_change(self, change: Change):
+        ...
+
+    def reset(self):
+        ...
+
+
+class ChangeFeed:
+    """
+    Keeps the in-process state (read cache, progress, plan indexes, status
+    subscribers) of several worker processes over one database coherent.
+
+    Every write records what it changed in the changes table, in the same
+    transaction. Each worker polls the table from a background thread and
+    hands the changes made by other workers to its listener, which applies
+    them exactly as if they had been made locally. Rows older than retention
+    are pruned, so a worker that could not poll for half of it may have
+    missed some and resets its state instead.
+
+    Sequence numbers are handed out at insert, not at commit, so on
+    PostgreSQL seq 11 can become visible before seq 10. Polls therefore
+    start after the highest seq below which every change has been seen, and
+    a missing seq is waited for up to gap_timeout. Past that it was most
+    likely rolled back, but the worker resets its state anyway, as it
+    cannot tell a rollback from a commit still to come.
+    """
+
+    def __init__(
+            self,
+            db: Engine,
+            poll_interval: float = 0.1,
+            retention: datetime.timedelta = datetime.timedelta(minutes=5),
+            gap_timeout: float = 10.0,
+    ) -> None:
+        self.db = db
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.gap_timeout = gap_timeout
+        self.origin = uuid.uuid4().hex
+        self.listener: Optional[ChangeListener] = None
+        # every change up to last_seq has been seen; above it, seen holds
+        # the ones that have and gaps when each missing one was noticed
+        self.last_seq: Optional[int] = None
+        self.seen: set[int] = set()
+        self.gaps: dict[int, float] = {}
+        self.polled_at: Optional[float] = None
+        self.applied = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, session: Session, kind: str, **payload: Any):
+        session.execute(insert(model.Change).values(
+            origin=self.origin,
+            kind=kind,
+            payload=json.dumps(payload),
+        ))
+
+    def poll(self):
+        """
+        Applies the changes committed by other workers since the last poll.
+        The first poll only takes note of where the feed is.
+        """
+        now = time.monotonic()
+        stalled = self.polled_at is not None and now - self.polled_at > self.retention.total_seconds() / 2
+        with Session(self.db) as session:
+            if self.last_seq is None or stalled:
+                if stalled:
+                    logger.warning('change feed stalled after seq %d, resetting in-process state', self.last_seq)
+                    self.listener.reset()
+                self.last_seq = session.scalar(select(func.coalesce(func.max(model.Change.seq), 0)))
+                self.seen.clear()
+                self.gaps.clear()
+                self.polled_at = now
+                return
+            rows = session.execute(
+                select(model.Change.seq, model.Change.origin, model.Change.kind, model.Change.payload).
+                where(model.Change.seq > self.last_seq).
+                order_by(model.Change.seq)
+            ).all()
+        self.polled_at = now
+
+        for seq, origin, kind, payload in rows:
+            if seq in self.seen:
+                continue
+            if origin != self.origin:
+                self.listener.apply_change(Change(kind, json.loads(payload)))
+                self.applied += 1
+            self.seen.add(seq)
+            self.gaps.pop(seq, None)
+
+        for seq in range(self.last_seq + 1, max(self.seen, default=self.last_seq)):
+            if seq not in self.seen:
+                self.gaps.setdefault(seq, now)
+        expired = [seq for seq, noticed in self.gaps.items() if now - noticed > self.gap_timeout]
+        if expired:
+            logger.info('change feed gave up waiting for seq %s, resetting in-process state', expired)
+            self.listener.reset()
+            for seq in expired:
+                del self.gaps[seq]
+                self.seen.add(seq)
+        while self.last_seq + 1 in self.seen:
+            self.last_seq += 1
+            self.seen.remove(self.last_seq)
+
+    def prune(self):
+        cutoff = datetime.datetime.utcnow() - self.retention
+        with Session(self.db) as session:
+            session.execute(delete(model.Change).where(model.Change.created_at < cutoff))
+            session.commit()
+
+    def start(self, listener: ChangeListener):
+        self.listener = listener
+        self.poll()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        polls = 0
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+                polls += 1
+                # pruning is rare and idempotent, so every worker may do it
+                if polls % 600 == 0:
+                    self.prune()
+            except Exception:
+                logger.exception('change feed poll failed')
@@ -0,0 +1,171 @@
+import bisect
+import contextvars
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import Engine, event
+
+
+logger = logging.getLogger('waverunner.slow_requests')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # per bucket, not cumulative; the last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str, lines: list[str]):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+
+
+class RequestStats:
+    __slots__ = ('statements', 'db_seconds', 'sql')
+
+    def __init__(self, capture_sql: bool) -> None:
+        self.statements = 0
+        self.db_seconds = 0.0
+        # (seconds, statement) of every query, only kept for the slow request log
+        self.sql: Optional[list[tuple[float, str]]] = [] if capture_sql else None
+
+
+# stats of the request being served; copied into the threads that run the
+# service calls, so queries issued there are still attributed to it
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar('current_request', default=None)
+
+
+class Metrics:
+    """
+    Per-route request metrics, rendered in the Prometheus text format.
+
+    Request durations, SQL statement counts and database time per request are
+    kept as histograms per route. Everything is updated from the event loop
+    once a request is done, so no locking is needed; SQL timings are collected
+    into the request's RequestStats by engine events first.
+    """
+
+    def __init__(self, slow_request_seconds: Optional[float] = None) -> None:
+        self.slow_request_seconds = slow_request_seconds
+        self.in_flight = 0
+        self.requests: dict[tuple[str, int], int] = {}
+        self.durations: dict[str, Histogram] = {}
+        self.statements: dict[str, Histogram] = {}
+        self.db_seconds: dict[str, Histogram] = {}
+
+    def instrument(self, *engines: Engine):
+        for engine in set(engines):
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def start_request(self) -> RequestStats:
+        self.in_flight += 1
+        return RequestStats(capture_sql=self.slow_request_seconds is not None)
+
+    def finish_request(self, route: str, status: int, seconds: float, stats: RequestStats):
+        self.in_flight -= 1
+        self.requests[route, status] = self.requests.get((route, status), 0) + 1
+        if route not in self.durations:
+            self.durations[route] = Histogram(DURATION_BUCKETS)
+            self.statements[route] = Histogram(STATEMENT_BUCKETS)
+            self.db_seconds[route] = Histogram(DURATION_BUCKETS)
+        self.durations[route].observe(seconds)
+        self.statements[route].observe(stats.statements)
+        self.db_seconds[route].observe(stats.db_seconds)
+
+        if self.slow_request_seconds is not None and seconds >= self.slow_request_seconds:
+            queries = ''.join(f'\n  {elapsed * 1000:.1f}ms {" ".join(sql.split())}' for elapsed, sql in stats.sql)
+            logger.warning(
+                'slow request %s: %.1fms, %d statements, %.1fms in the database%s',
+                route, seconds * 1000, stats.statements, stats.db_seconds * 1000, queries,
+            )
+
+    def render(self) -> str:
+        lines = [
+            '# HELP waverunner_http_requests_in_flight Requests being served.',
+            '# TYPE waverunner_http_requests_in_flight gauge',
+            f'waverunner_http_requests_in_flight {self.in_flight}',
+            '# HELP waverunner_http_requests_total Requests served, by route and status.',
+            '# TYPE waverunner_http_requests_total counter',
+        ]
+        for (route, status), count in sorted(self.requests.items()):
+            lines.append(f'waverunner_http_requests_total{{route="{route}",status="{status}"}} {count}')
+        for name, help_text, histograms in (
+                ('waverunner_http_request_duration_seconds', 'Request duration.', self.durations),
+                ('waverunner_request_sql_statements', 'SQL statements issued per request.', self.statements),
+                ('waverunner_request_db_seconds', 'Time spent in SQL statements per request.', self.db_seconds),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for route, histogram in sorted(histograms.items()):
+                histogram.render(name, f'route="{route}"', lines)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_request.get() is not None:
+            context.query_started = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - context.query_started
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if stats.sql is not None:
+            stats.sql.append((elapsed, statement))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware feeding Metrics with every HTTP request of the app it
+    wraps. Requests are labelled with their route template, or "unmatched".
+    """
+
+    def __init__(self, app, metrics: Metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        stats = self.metrics.start_request()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - started
+            current_request.reset(token)
+            # the router stores the matched route in the scope
+            route = scope.get('route')
+            self.metrics.finish_request(route.path if route is not None else 'unmatched', status, seconds, stats)
@@ -0,0 +1,71 @@
+import functools
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from config import ExecutionMode
+
+
+T = TypeVar('T')
+
+
+class ConcurrencyLimit:
+    """
+    Lazily built capacity limiter shared by every offloaded service, so the
+    bound applies to the database as a whole and not per service.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.max_concurrency = max_concurrency
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+
+    def get(self) -> anyio.CapacityLimiter:
+        # anyio limiters can only be created while an event loop is running
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.max_concurrency)
+        return self._limiter
+
+
+class AsyncService(Generic[T]):
+    """
+    Exposes the public methods of a blocking service as coroutines.
+
+    In THREADPOOL mode every call runs on a worker thread, and at most
+    max_concurrency calls touch the database at the same time. In INLINE mode
+    calls run directly on the event loop, which is the old behaviour.
+    """
+
+    def __init__(self, service: T, mode: ExecutionMode, limiter: Optional[ConcurrencyLimit] = None) -> None:
+        self.service = service
+        self.mode = mode
+        self.limiter = limiter
+        self._methods: dict[str, Callable[..., Any]] = {}
+
+    def wrap(self, obj: Any) -> 'AsyncService':
+        """
+        Offloads another blocking object (e.g. a stateful importer returned by
+        the service) with the same mode and limiter.
+        """
+        return AsyncService(obj, self.mode, self.limiter)
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = self._methods.get(name)
+        if method is None:
+            method = self._wrap(getattr(self.service, name))
+            self._methods[name] = method
+        return method
+
+    def _wrap(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        async def call(*args, **kwargs):
+            if self.mode == ExecutionMode.INLINE:
+                return fn(*args, **kwargs)
+            limiter = self.limiter and self.limiter.get()
+            return await anyio.to_thread.run_sync(
+                functools.partial(fn, *args, **kwargs), limiter=limiter
+            )
+
+        return call
@@ -0,0 +1,61 @@
+import base64
+import binascii
+import datetime
+import json
+from http import HTTPStatus
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+T = TypeVar('T')
+
+
+class Keyset:
+    """
+    Keyset (cursor) pagination over a fixed set of columns, which should be
+    covered by an index so every page is a range scan starting at the cursor.
+
+    Cursors are opaque to clients: the last row's key values, base64 encoded.
+    """
+
+    def __init__(self, *columns: InstrumentedAttribute, descending: bool = False) -> None:
+        self.columns = columns
+        self.descending = descending
+
+    def apply(self, stmt: Select, page_size: Optional[int], cursor: Optional[str]) -> Select:
+        if page_size is None and cursor is None:
+            return stmt
+        if cursor is not None:
+            after = tuple_(*self.columns)
+            values = tuple_(*self.decode(cursor))
+            stmt = stmt.where(after < values if self.descending else after > values)
+        stmt = stmt.order_by(*(column.desc() if self.descending else column for column in self.columns))
+        if page_size is not None:
+            # one extra row tells whether there is a next page
+            stmt = stmt.limit(page_size + 1)
+        return stmt
+
+    def page(self, rows: Sequence[T], page_size: Optional[int], key: Callable[[T], tuple]) -> tuple[Sequence[T], Optional[str]]:
+        if page_size is None or len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        return rows, self.encode(key(rows[-1]))
+
+    def encode(self, values: tuple) -> str:
+        payload = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def decode(self, cursor: str) -> list[Any]:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.columns):
+                raise ValueError(cursor)
+            return [
+                datetime.datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+                for column, value in zip(self.columns, values)
+            ]
+        except (ValueError, TypeError, binascii.Error):
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='invalid cursor')
@@ -0,0 +1,259 @@
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import dto
+import model
+
+
+NONE = -1
+
+
+class PlanIndex:
+    """
+    Adjacency index of one runbook's tasks. Tasks are numbered by position,
+    so edges are plain lists of ints. Only statuses ever change; any other
+    change to the runbook's tasks invalidates the whole index.
+    """
+
+    def __init__(self, runbook_uuid: str) -> None:
+        self.runbook_uuid = runbook_uuid
+        self.uuids: list[str] = []
+        self.positions: dict[str, int] = {}
+        self.parent: list[int] = []
+        self.depends_on: list[int] = []
+        self.children: list[list[int]] = []
+        self.statuses: list[model.TaskStatus] = []
+        # dependencies in other runbooks, by uuid, with their status
+        self.external: dict[str, model.TaskStatus] = {}
+        self.external_depends_on: dict[int, str] = {}
+        # parents before children, computed once
+        self.preorder: list[int] = []
+        self._successors: Optional[list[list[int]]] = None
+        self._events: Optional[tuple[list[int], list[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.uuids)
+
+    @staticmethod
+    def load(session: Session, runbook_uuid: str) -> 'PlanIndex':
+        rows = session.execute(
+            select(model.Task.uuid, model.Task.parent_task_uuid, model.Task.depends_on_task_uuid, model.TaskStatusUpdate.status).
+            outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid).
+            where(model.Task.runbook_uuid == runbook_uuid)
+        ).all()
+
+        index = PlanIndex(runbook_uuid)
+        for task_uuid, _, _, status in rows:
+            index.positions[task_uuid] = len(index.uuids)
+            index.uuids.append(task_uuid)
+            index.statuses.append(status or model.TaskStatus.NOT_STARTED)
+            index.children.append([])
+
+        external: list[str] = []
+        for position, (_, parent_uuid, depends_on_uuid, _) in enumerate(rows):
+            parent = index.positions.get(parent_uuid, NONE) if parent_uuid else NONE
+            index.parent.append(parent)
+            if parent != NONE:
+                index.children[parent].append(position)
+            depends_on = NONE
+            if depends_on_uuid:
+                depends_on = index.positions.get(depends_on_uuid, NONE)
+                if depends_on == NONE:
+                    index.external_depends_on[position] = depends_on_uuid
+                    external.append(depends_on_uuid)
+            index.depends_on.append(depends_on)
+
+        if external:
+            for task_uuid, status in session.execute(
+                select(model.Task.uuid, model.TaskStatusUpdate.status).
+                outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid).
+                where(model.Task.uuid.in_(external))
+            ):
+                index.external[task_uuid] = status or model.TaskStatus.NOT_STARTED
+
+        stack = [position for position in reversed(range(len(rows))) if index.parent[position] == NONE]
+        while stack:
+            position = stack.pop()
+            index.preorder.append(position)
+            stack.extend(reversed(index.children[position]))
+        return index
+
+    def set_status(self, task_uuid: str, status: model.TaskStatus):
+        position = self.positions.get(task_uuid)
+        if position is not None:
+            self.statuses[position] = status
+        elif task_uuid in self.external:
+            self.external[task_uuid] = status
+
+    def events(self) -> tuple[list[int], list[int]]:
+        """
+        Topological order of the start (position) and end (len + position)
+        events of all tasks, and the tasks left out because of a cycle.
+
+        A task starts after its parent starts and after its dependency ends;
+        it ends after it starts and after all of its subtasks end. So the
+        dependency of a parent also holds back every task below it.
+        """
+        if self._events is None:
+            n = len(self)
+            successors = self.successors()
+            incoming = [0] * (2 * n)
+            for targets in successors:
+                for target in targets:
+                    incoming[target] += 1
+            order = [event for event in range(2 * n) if incoming[event] == 0]
+            for event in order:
+                for target in successors[event]:
+                    incoming[target] -= 1
+                    if incoming[target] == 0:
+                        order.append(target)
+            started = {event for event in order if event < n}
+            self._events = order, [position for position in range(n) if position not in started]
+        return self._events
+
+    def successors(self) -> list[list[int]]:
+        if self._successors is None:
+            n = len(self)
+            successors: list[list[int]] = [[] for _ in range(2 * n)]
+            for position in range(n):
+                successors[position].append(n + position)
+                parent = self.parent[position]
+                if parent != NONE:
+                    successors[parent].append(position)
+                    successors[n + position].append(n + parent)
+                depends_on = self.depends_on[position]
+                if depends_on != NONE:
+                    successors[n + depends_on].append(position)
+            self._successors = successors
+        return self._successors
+
+    def plan(self, statuses: list[model.TaskStatus], external: dict[str, model.TaskStatus], req: dto.RunbookPlanRequest) -> dto.RunbookPlanResponse:
+        n = len(self)
+        completed = model.TaskStatus.COMPLETED
+
+        # a task may start once its own dependency and those of all of its
+        # ancestors are completed; only tasks without subtasks are run
+        unblocked = [False] * n
+        for position in self.preorder:
+            depends_on = self.depends_on[position]
+            if depends_on != NONE:
+                ready = statuses[depends_on] == completed
+            elif position in self.external_depends_on:
+                ready = external.get(self.external_depends_on[position]) == completed
+            else:
+                ready = True
+            parent = self.parent[position]
+            unblocked[position] = ready and (parent == NONE or unblocked[parent])
+        ready_uuids = [
+            self.uuids[position] for position in range(n)
+            if unblocked[position] and not self.children[position] and statuses[position] == model.TaskStatus.NOT_STARTED
+        ]
+
+        events, cyclic = self.events()
+        order: Optional[list[str]] = None
+        if req.include_order:
+            order = [self.uuids[event] for event in events if event < n]
+
+        critical_path: Optional[list[str]] = None
+        if req.include_critical_path:
+            critical_path = self._critical_path(events, statuses)
+
+        return dto.RunbookPlanResponse(
+            ready=ready_uuids,
+            order=order,
+            critical_path=critical_path,
+            cyclic=[self.uuids[position] for position in cyclic],
+        )
+
+    def _critical_path(self, events: list[int], statuses: list[model.TaskStatus]) -> list[str]:
+        """
+        Longest chain of tasks still to be completed that have to run one after
+        the other, counting every task without subtasks as one unit of work.
+        """
+        n = len(self)
+        successors = self.successors()
+        distance = [0] * (2 * n)
+        previous = [NONE] * (2 * n)
+        for event in events:
+            for target in successors[event]:
+                weight = 0
+                if target == n + event and not self.children[event] and statuses[event] != model.TaskStatus.COMPLETED:
+                    weight = 1
+                if distance[event] + weight > distance[target]:
+                    distance[target] = distance[event] + weight
+                    previous[target] = event
+
+        path: list[str] = []
+        event = max(range(2 * n), key=distance.__getitem__, default=NONE)
+        while event != NONE and distance[event] > 0:
+            before = previous[event]
+            if event >= n and before == event - n and distance[event] > distance[before]:
+                path.append(self.uuids[before])
+            event = before
+        path.reverse()
+        return path
+
+
+class RunbookPlanner:
+    """
+    Keeps the plan index of recently planned runbooks. Committed status
+    updates are applied to the cached indexes in place; structural changes
+    drop the runbook's index so the next plan reloads it.
+
+    Like ProgressCache, every change bumps a generation number and an index
+    loaded while a change happened is used once but not kept.
+    """
+
+    def __init__(self, max_runbooks: int = 100) -> None:
+        self.max_runbooks = max_runbooks
+        self.indexes: OrderedDict[str, PlanIndex] = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def plan(self, session: Session, req: dto.RunbookPlanRequest) -> dto.RunbookPlanResponse:
+        with self.lock:
+            index = self.indexes.get(req.uuid)
+            if index is not None:
+                self.indexes.move_to_end(req.uuid)
+            generation = self.generation
+
+        if index is None:
+            if session.get(model.Runbook, req.uuid) is None:
+                raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='runbook not found')
+            index = PlanIndex.load(session, req.uuid)
+            with self.lock:
+                if generation == self.generation:
+                    self.indexes[req.uuid] = index
+                    if len(self.indexes) > self.max_runbooks:
+                        self.indexes.popitem(last=False)
+
+        with self.lock:
+            # statuses are copied so updates can go on while the plan is computed
+            statuses = list(index.statuses)
+            external = dict(index.external)
+        return index.plan(statuses, external, req)
+
+    def update_statuses(self, updates: Iterable[tuple[str, model.TaskStatus]]):
+        with self.lock:
+            self.generation += 1
+            if not self.indexes:
+                return
+            for task_uuid, status in updates:
+                for index in self.indexes.values():
+                    index.set_status(task_uuid, status)
+
+    def invalidate(self, runbook_uuid: str):
+        with self.lock:
+            self.generation += 1
+            self.indexes.pop(runbook_uuid, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.indexes.clear()
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import dto
+import model
+from .task_tree import TaskTree
+
+
+def load_progress(session: Session, task_uuid: str) -> dto.TaskProgressDto:
+    """
+    Counts the leaf tasks of the subtree of task_uuid by status, with a
+    single aggregate query. A task without subtasks is its own only leaf.
+    """
+    is_leaf = sum(getattr(model.Task, column) for column in model.SUBTASK_COUNTERS.values()) == 0
+    rows = session.execute(
+        select(model.TaskStatusUpdate.status, func.count()).
+        select_from(model.Task).
+        outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid).
+        where(model.Task.uuid.in_(TaskTree.subtree(task_uuid))).
+        where(is_leaf).
+        group_by(model.TaskStatusUpdate.status)
+    )
+    counts = dict.fromkeys(model.TaskStatus, 0)
+    for status, count in rows:
+        counts[status or model.TaskStatus.NOT_STARTED] += count
+    return dto.TaskProgressDto.from_counts(counts)
+
+
+class ProgressCache:
+    """
+    Subtree progress per task. Entries are dropped when the status of any task
+    in their subtree changes; callers pass the updated tasks and all their
+    ancestors to invalidate.
+
+    Every invalidation bumps a generation number, and put() ignores values
+    computed before the latest invalidation, so a slow read racing with a
+    status update can never store stale progress.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, dto.TaskProgressDto] = OrderedDict()
+        # runbook of each entry's task
+        self.runbooks: dict[str, str] = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, task_uuid: str) -> Optional[dto.TaskProgressDto]:
+        return self.entries.get(task_uuid)
+
+    def put(self, task_uuid: str, runbook_uuid: str, progress: dto.TaskProgressDto, generation: int):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[task_uuid] = progress
+            self.runbooks[task_uuid] = runbook_uuid
+            if len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                self.runbooks.pop(evicted, None)
+
+    def invalidate(self, task_uuids: Iterable[str]):
+        with self.lock:
+            self.generation += 1
+            for task_uuid in task_uuids:
+                self.entries.pop(task_uuid, None)
+                self.runbooks.pop(task_uuid, None)
+
+    def invalidate_runbook(self, runbook_uuid: str):
+        with self.lock:
+            self.generation += 1
+            for task_uuid in [task_uuid for task_uuid, of in self.runbooks.items() if of == runbook_uuid]:
+                self.entries.pop(task_uuid, None)
+                del self.runbooks[task_uuid]
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.runbooks.clear()
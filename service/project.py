@@ -1,28 +1,37 @@
+import datetime
 import uuid
 from http import HTTPStatus
+from typing import Optional
 
 from fastapi import HTTPException
-from sqlalchemy import Engine, select
+from sqlalchemy import Engine, case, func, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import DatabaseError
 
 import dto
 import model
+from .cache import ReadCache
+from .pagination import Keyset
 
 
 class ProjectService:
 
-    def __init__(self, db: Engine) -> None:
+    def __init__(self, db: Engine, cache: Optional[ReadCache] = None, read_db: Optional[Engine] = None) -> None:
         self.db = db
+        self.read_db = read_db or db
+        self.cache = cache or ReadCache()
 
     def get(self, req: dto.ProjectGetRequest) -> dto.ProjectGetResponse:
-        with Session(self.db) as session:
-            project: model.Project = session.query(model.Project).get(req.uuid)
-            if project is None:
-                raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
-            return dto.ProjectGetResponse(
-                project=dto.ProjectDto.from_model(project)
-            )
+        def load() -> dto.ProjectGetResponse:
+            with Session(self.read_db) as session:
+                project: model.Project = session.query(model.Project).get(req.uuid)
+                if project is None:
+                    raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+                return dto.ProjectGetResponse(
+                    project=dto.ProjectDto.from_model(project)
+                )
+
+        return self.cache.get_or_load(('project', req.uuid), load)
 
     def create(self, req: dto.ProjectCreateRequest) -> dto.ProjectCreateResponse:
         with Session(self.db) as session:
@@ -43,8 +52,58 @@ class ProjectService:
                 )
 
     def list(self, req: dto.ProjectListRequest) -> dto.ProjectListResponse:
-        with Session(self.db) as session:
-            projects = session.scalars(select(model.Project))
+        with Session(self.read_db) as session:
+            keyset = Keyset(model.Project.uuid)
+            stmt = keyset.apply(select(model.Project), req.page_size, req.cursor)
+            projects, next_cursor = keyset.page(session.scalars(stmt).all(), req.page_size, lambda p: (p.uuid,))
             return dto.ProjectListResponse(
-                projects=list(map(dto.ProjectDto.from_model, projects))
+                projects=list(map(dto.ProjectDto.from_model, projects)),
+                next_cursor=next_cursor,
+            )
+
+    def summary(self, req: dto.ProjectSummaryRequest) -> dto.ProjectSummaryResponse:
+        """
+        Progress and last activity of every runbook of the project, from a
+        single aggregate query over their tasks and last statuses, however
+        many runbooks there are.
+        """
+        with Session(self.read_db) as session:
+            project = session.get(model.Project, req.uuid)
+            if project is None:
+                raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+
+            is_leaf = sum(getattr(model.Task, column) for column in model.SUBTASK_COUNTERS.values()) == 0
+            rows = session.execute(
+                select(
+                    model.Runbook,
+                    model.TaskStatusUpdate.status,
+                    func.count(case((is_leaf, 1))),
+                    func.max(model.TaskStatusUpdate.updated_at),
+                ).
+                outerjoin(model.Task, model.Task.runbook_uuid == model.Runbook.uuid).
+                outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid).
+                where(model.Runbook.project_uuid == req.uuid).
+                group_by(model.Runbook.uuid, model.TaskStatusUpdate.status).
+                order_by(model.Runbook.uuid)
+            )
+
+            # one row per runbook and status; a runbook without tasks still gets one
+            runbooks: dict[str, tuple[model.Runbook, dict[model.TaskStatus, int]]] = {}
+            last_activity: dict[str, datetime.datetime] = {}
+            for runbook, status, leaves, updated_at in rows:
+                _, counts = runbooks.setdefault(runbook.uuid, (runbook, dict.fromkeys(model.TaskStatus, 0)))
+                counts[status or model.TaskStatus.NOT_STARTED] += leaves
+                if updated_at is not None and (runbook.uuid not in last_activity or updated_at > last_activity[runbook.uuid]):
+                    last_activity[runbook.uuid] = updated_at
+
+            return dto.ProjectSummaryResponse(
+                project=dto.ProjectDto.from_model(project),
+                runbooks=[
+                    dto.RunbookSummaryDto(
+                        runbook=dto.RunbookDto.from_model(runbook),
+                        progress=dto.TaskProgressDto.from_counts(counts),
+                        last_activity_at=last_activity.get(runbook.uuid),
+                    )
+                    for runbook, counts in runbooks.values()
+                ],
             )
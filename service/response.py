@@ -0,0 +1,17 @@
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+
+
+class ModelResponse(JSONResponse):
+    """
+    JSON response rendered by pydantic-core in a single pass straight to
+    bytes. Takes models as they are, so a handler returning one skips the
+    response_model validation and jsonable_encoder pass FastAPI otherwise
+    runs on its result; plain content (e.g. what FastAPI already encoded
+    when this is the default response class) renders the same way.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
@@ -9,12 +9,26 @@ from typing import Optional
 
 import dto
 import model
+from .cache import ReadCache
+from .pagination import Keyset
+from .planner import RunbookPlanner
+from .runbook_clone import clone_tasks
+from .runbook_export import RunbookExport
 
 
 class RunbookService:
 
-    def __init__(self, db: Engine) -> None:
+    def __init__(
+            self,
+            db: Engine,
+            cache: Optional[ReadCache] = None,
+            read_db: Optional[Engine] = None,
+            planner: Optional[RunbookPlanner] = None,
+    ) -> None:
         self.db = db
+        self.read_db = read_db or db
+        self.cache = cache or ReadCache()
+        self.planner = planner or RunbookPlanner()
 
     def create(self, req: dto.RunbookCreateRequest) -> dto.RunbookCreateResponse:
         with Session(self.db) as session:
@@ -41,20 +55,77 @@ class RunbookService:
                 )
 
     def list(self, req: dto.RunbookListRequest) -> dto.RunbookListResponse:
-        with Session(self.db) as session:
-            runbooks = session.scalars(
-                select(model.Runbook).where(model.Runbook.project_uuid == req.project_uuid)
+        with Session(self.read_db) as session:
+            keyset = Keyset(model.Runbook.uuid)
+            stmt = keyset.apply(
+                select(model.Runbook).where(model.Runbook.project_uuid == req.project_uuid),
+                req.page_size,
+                req.cursor,
             )
+            runbooks, next_cursor = keyset.page(session.scalars(stmt).all(), req.page_size, lambda r: (r.uuid,))
 
             return dto.RunbookListResponse(
-                runbooks=map(dto.RunbookDto.from_model, runbooks)
+                runbooks=map(dto.RunbookDto.from_model, runbooks),
+                next_cursor=next_cursor,
             )
 
     def get(self, req: dto.RunbookGetRequest) -> dto.RunbookGetResponse:
+        def load() -> dto.RunbookGetResponse:
+            with Session(self.read_db) as session:
+                runbook: Optional[model.Runbook] = session.query(model.Runbook).get(req.uuid)
+                if runbook is None:
+                    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='runbook not found')
+                return dto.RunbookGetResponse(
+                    runbook=dto.RunbookDto.from_model(runbook),
+                )
+
+        return self.cache.get_or_load(('runbook', req.uuid), load)
+
+    def clone(self, req: dto.RunbookCloneRequest) -> dto.RunbookCloneResponse:
         with Session(self.db) as session:
-            runbook: Optional[model.Runbook] = session.query(model.Runbook).get(req.uuid)
-            if runbook is None:
-                raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='runbook not found')
-            return dto.RunbookGetResponse(
-                runbook=dto.RunbookDto.from_model(runbook),
-            )
+            session.begin()
+            try:
+                template: Optional[model.Runbook] = session.query(model.Runbook).get(req.uuid)
+                if template is None:
+                    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='runbook not found')
+                project_uuid = req.project_uuid or template.project_uuid
+                if session.query(model.Project).get(project_uuid) is None:
+                    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='project not found')
+                runbook = model.Runbook(
+                    uuid=str(uuid.uuid4()),
+                    name=req.name if req.name is not None else template.name,
+                    source=req.source if req.source is not None else template.source,
+                    target=req.target if req.target is not None else template.target,
+                    project_uuid=project_uuid,
+                )
+                session.add(runbook)
+                session.flush()
+                tasks = clone_tasks(session, template.uuid, runbook.uuid)
+            except DatabaseError:
+                session.rollback()
+                raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+            else:
+                session.commit()
+                return dto.RunbookCloneResponse(
+                    created=dto.RunbookDto.from_model(runbook),
+                    tasks=tasks,
+                )
+
+    def plan(self, req: dto.RunbookPlanRequest) -> dto.RunbookPlanResponse:
+        # the index is kept up to date with status updates as they commit, so
+        # it must be loaded from db and not from a possibly lagging replica
+        with Session(self.db) as session:
+            return self.planner.plan(session, req)
+
+    def open_export(self, req: dto.RunbookExportRequest) -> RunbookExport:
+        """
+        Starts an export in its own read snapshot. Its chunks close it once
+        they are exhausted or discarded; otherwise the caller must close it.
+        """
+        session = Session(self.read_db)
+        RunbookExport.begin_snapshot(session)
+        runbook: Optional[model.Runbook] = session.query(model.Runbook).get(req.uuid)
+        if runbook is None:
+            session.close()
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='runbook not found')
+        return RunbookExport(session, runbook, include_history=req.include_history, compress=req.gzip)
@@ -0,0 +1,88 @@
+from sqlalchemy import Column, MetaData, String, Table, insert, literal, literal_column, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+import model
+
+
+class new_uuid(FunctionElement):
+    """
+    A random version 4 uuid as text, generated by the database itself.
+    """
+    type = String()
+    inherit_cache = True
+
+
+@compiles(new_uuid, 'postgresql')
+def _new_uuid_postgresql(element, compiler, **kw):
+    return 'CAST(gen_random_uuid() AS TEXT)'
+
+
+@compiles(new_uuid, 'sqlite')
+def _new_uuid_sqlite(element, compiler, **kw):
+    return (
+        "lower(hex(randomblob(4)) || '-' || hex(randomblob(2)) || '-4' || substr(hex(randomblob(2)), 2) || '-' || "
+        "substr('89ab', 1 + abs(random()) % 4, 1) || substr(hex(randomblob(2)), 2) || '-' || hex(randomblob(6)))"
+    )
+
+
+# old task uuid -> uuid of its copy, lives only for the clone's transaction
+_task_map = Table(
+    'task_clone_map',
+    MetaData(),
+    Column('old_uuid', String, primary_key=True),
+    Column('new_uuid', String, nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+
+def clone_tasks(session: Session, source_runbook_uuid: str, target_runbook_uuid: str) -> int:
+    """
+    Copies every task of a runbook into another one with two INSERT ... SELECT
+    statements, remapping parents and dependencies to the copies. Returns the
+    number of tasks copied.
+
+    The copies have no status, so each one counts all of its subtasks as not
+    started. Dependencies on tasks of other runbooks are not copied. On SQLite
+    the copies are inserted in the order of the originals, so subtasks keep
+    their order.
+    """
+    connection = session.connection()
+    _task_map.create(connection, checkfirst=True)
+    try:
+        connection.execute(insert(_task_map).from_select(
+            ['old_uuid', 'new_uuid'],
+            select(model.Task.uuid, new_uuid()).where(model.Task.runbook_uuid == source_runbook_uuid),
+        ))
+
+        task = _task_map.alias('task')
+        parent = _task_map.alias('parent')
+        dependency = _task_map.alias('dependency')
+        source = model.Task.__table__.alias('source')
+        counters = list(model.SUBTASK_COUNTERS.values())
+        stmt = (
+            select(
+                task.c.new_uuid,
+                source.c.description,
+                literal(target_runbook_uuid),
+                parent.c.new_uuid,
+                dependency.c.new_uuid,
+                sum(source.c[column] for column in counters),
+                *(literal(0) for _ in counters[1:]),
+            ).
+            select_from(source).
+            join(task, task.c.old_uuid == source.c.uuid).
+            outerjoin(parent, parent.c.old_uuid == source.c.parent_task_uuid).
+            outerjoin(dependency, dependency.c.old_uuid == source.c.depends_on_task_uuid)
+        )
+        if connection.dialect.name == 'sqlite':
+            # subtasks come back in insertion order
+            stmt = stmt.order_by(literal_column('source.rowid'))
+        copied = connection.execute(insert(model.Task).from_select(
+            ['uuid', 'description', 'runbook_uuid', 'parent_task_uuid', 'depends_on_task_uuid', *counters],
+            stmt,
+        ))
+        return copied.rowcount
+    finally:
+        _task_map.drop(connection)
@@ -0,0 +1,133 @@
+import zlib
+from typing import Iterator, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session, aliased
+
+import dto
+import model
+
+
+class RunbookExport:
+    """
+    Writes a runbook as NDJSON: a runbook line, its tasks in pre-order as
+    TaskImportLineDto (keyed by their uuid, with explicit dependencies) and,
+    optionally, every status update the tasks ever had, archived ones too.
+    The task lines can be fed back into TaskStreamImport as they are.
+
+    Subtasks are read one parent at a time and all rows are fetched in
+    batches, so only the children of the tasks on the current path are held
+    in memory however large the runbook is. Everything is read from the one
+    snapshot begin_snapshot() opened on the session, which must be closed
+    once done.
+    """
+
+    def __init__(
+            self,
+            session: Session,
+            runbook: model.Runbook,
+            include_history: bool = False,
+            compress: bool = False,
+            batch_size: int = 1000,
+            chunk_size: int = 64 * 1024,
+    ) -> None:
+        self.session = session
+        self.runbook = runbook
+        self.include_history = include_history
+        self.compress = compress
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def begin_snapshot(session: Session):
+        """
+        Starts a transaction that reads from a single snapshot until the
+        session is closed. pysqlite runs SELECTs outside of any transaction,
+        so each could see other commits, and PostgreSQL's default READ
+        COMMITTED takes a new snapshot per statement.
+        """
+        if session.bind.dialect.name == 'sqlite':
+            # the snapshot is taken by the first read after BEGIN; in WAL
+            # mode writers carry on meanwhile
+            session.connection().exec_driver_sql('BEGIN')
+        else:
+            session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+
+    def chunks(self) -> Iterator[bytes]:
+        try:
+            # wbits=31 writes a gzip header and trailer
+            compressor = zlib.compressobj(wbits=31) if self.compress else None
+            buffer = bytearray()
+            for line in self.lines():
+                buffer += line.model_dump_json().encode()
+                buffer += b'\n'
+                if len(buffer) >= self.chunk_size:
+                    chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+                    buffer.clear()
+                    if chunk:
+                        yield chunk
+            chunk = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+            if chunk:
+                yield chunk
+        finally:
+            self.close()
+
+    def lines(self) -> Iterator[BaseModel]:
+        yield dto.RunbookExportLineDto(
+            uuid=self.runbook.uuid,
+            project_uuid=self.runbook.project_uuid,
+            name=self.runbook.name,
+            source=self.runbook.source,
+            target=self.runbook.target,
+        )
+
+        stack = [self._subtasks(None)]
+        while stack:
+            task = next(stack[-1], None)
+            if task is None:
+                stack.pop()
+                continue
+            task_uuid, description, depends_on, subtasks = task
+            yield dto.TaskImportLineDto(description=description, depth=len(stack) - 1, key=task_uuid, depends_on=depends_on)
+            if subtasks:
+                stack.append(self._subtasks(task_uuid))
+
+        if self.include_history:
+            yield from self._history(model.TaskStatusArchive)
+            yield from self._history(model.TaskStatusUpdate)
+
+    def close(self):
+        self.session.close()
+
+    def _subtasks(self, parent_uuid: Optional[str]) -> Iterator[tuple]:
+        dependency = aliased(model.Task)
+        stmt = select(
+            model.Task.uuid,
+            model.Task.description,
+            # dependencies on tasks of other runbooks cannot be imported
+            case((dependency.runbook_uuid == self.runbook.uuid, dependency.uuid), else_=None),
+            sum(getattr(model.Task, column) for column in model.SUBTASK_COUNTERS.values()),
+        ).outerjoin(dependency, dependency.uuid == model.Task.depends_on_task_uuid)
+        if parent_uuid is None:
+            stmt = stmt.where(model.Task.runbook_uuid == self.runbook.uuid, model.Task.parent_task_uuid.is_(None))
+        else:
+            stmt = stmt.where(model.Task.parent_task_uuid == parent_uuid)
+        return iter(self.session.execute(stmt, execution_options={'yield_per': self.batch_size}))
+
+    def _history(self, table) -> Iterator[dto.TaskStatusExportLineDto]:
+        rows = self.session.execute(
+            select(table.task_uuid, table.uuid, table.status, table.detail, table.updated_at, table.updated_by).
+            join(model.Task, model.Task.uuid == table.task_uuid).
+            where(model.Task.runbook_uuid == self.runbook.uuid),
+            execution_options={'yield_per': self.batch_size},
+        )
+        for task_uuid, status_uuid, status, detail, updated_at, updated_by in rows:
+            yield dto.TaskStatusExportLineDto(
+                task=task_uuid,
+                uuid=status_uuid,
+                status=status,
+                detail=detail,
+                updated_at=updated_at,
+                updated_by=updated_by,
+            )
@@ -0,0 +1,215 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+try:
+    # in requirements.txt; without it assets are only served gzipped
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# build output names content hashes in, e.g. main.10f2f7a8f2e40975.js
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{16,}\.[a-z0-9]+$')
+COMPRESSIBLE = re.compile(r'^(text/|application/(javascript|json|xml)|image/(svg\+xml|x-icon|vnd\.microsoft\.icon))')
+# encodings by preference, with the suffix of their precompressed files
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+class Asset:
+    __slots__ = ('content_type', 'cache_control', 'variants')
+
+    def __init__(self, content_type: str, cache_control: str) -> None:
+        self.content_type = content_type
+        self.cache_control = cache_control
+        # encoding ('identity', 'gzip', 'br') -> (body, etag)
+        self.variants: dict[str, tuple[bytes, str]] = {}
+
+    def add(self, encoding: str, body: bytes):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants[encoding] = (body, f'"{digest}"')
+
+
+def compress(encoding: str, body: bytes) -> bytes:
+    if encoding == 'gzip':
+        # mtime=0 so the output, and so its etag, only depends on the input
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return brotli.compress(body, quality=11)
+
+
+def precompress(directory: str) -> list[str]:
+    """
+    Writes the .gz (and, with brotli installed, .br) variant next to every
+    compressible file of directory, for a build step to run once so
+    StaticAssets only has to read them. Returns the files written.
+    """
+    written = []
+    for name in _files(directory):
+        content_type = mimetypes.guess_type(name)[0] or ''
+        if not COMPRESSIBLE.match(content_type):
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            body = f.read()
+        for encoding, suffix in ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            compressed = compress(encoding, body)
+            if len(compressed) < len(body):
+                with open(os.path.join(directory, name + suffix), 'wb') as f:
+                    f.write(compressed)
+                written.append(name + suffix)
+    return written
+
+
+class StaticAssets:
+    """
+    Serves a built frontend from memory, in place of StaticFiles(html=True).
+
+    Every file is read once, along with its gzip and brotli variants: the
+    precompressed .gz/.br files next to it when the build wrote them (see
+    precompress), otherwise compressed on load. Each request gets the best
+    variant its Accept-Encoding allows. Fingerprinted files never change
+    under their name, so they are cached as immutable; anything else
+    (index.html) is revalidated every time against its strong ETag and
+    answered with a 304 while unchanged.
+
+    Files are loaded on the first request, or earlier by calling load().
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.assets: Optional[dict[str, Asset]] = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.assets is not None:
+                return
+            assets = {}
+            names = set(_files(self.directory))
+            for name in names:
+                if any(name.endswith(suffix) and name[:-len(suffix)] in names for _, suffix in ENCODINGS):
+                    continue
+                assets[name] = self._load(name, names)
+            self.assets = assets
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            raise RuntimeError('StaticAssets only serves http')
+        if scope['method'] not in ('GET', 'HEAD'):
+            response = PlainTextResponse('Method Not Allowed', status_code=405, headers={'allow': 'GET, HEAD'})
+            await response(scope, receive, send)
+            return
+        if self.assets is None:
+            # reading and compressing every file must not block the loop
+            await anyio.to_thread.run_sync(self.load)
+
+        # only names loaded from the directory are looked up, so paths need
+        # no normalizing against traversal
+        path, root_path = scope['path'], scope.get('root_path', '')
+        name = (path[len(root_path):] if path.startswith(root_path) else path).lstrip('/')
+        if name == '' or name.endswith('/'):
+            name += 'index.html'
+        asset = self.assets.get(name)
+        if asset is None:
+            await PlainTextResponse('Not Found', status_code=404)(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = self._negotiate(asset, request_headers.get('accept-encoding', ''))
+        body, etag = asset.variants[encoding]
+        headers = {
+            'cache-control': asset.cache_control,
+            'etag': etag,
+        }
+        if len(asset.variants) > 1:
+            headers['vary'] = 'Accept-Encoding'
+        if encoding != 'identity':
+            headers['content-encoding'] = encoding
+
+        if_none_match = _etags(request_headers.get('if-none-match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            headers.pop('content-encoding', None)
+            response = Response(status_code=304, headers=headers)
+        else:
+            response = Response(
+                body if scope['method'] == 'GET' else b'',
+                media_type=asset.content_type,
+                headers=headers,
+            )
+            if scope['method'] == 'HEAD':
+                response.headers['content-length'] = str(len(body))
+        await response(scope, receive, send)
+
+    def _load(self, name: str, names: set[str]) -> Asset:
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        asset = Asset(content_type, IMMUTABLE if FINGERPRINTED.search(name) else REVALIDATE)
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            body = f.read()
+        asset.add('identity', body)
+        if not COMPRESSIBLE.match(content_type):
+            return asset
+        for encoding, suffix in ENCODINGS:
+            if name + suffix in names:
+                with open(os.path.join(self.directory, name + suffix), 'rb') as f:
+                    compressed = f.read()
+            elif encoding == 'br' and brotli is None:
+                continue
+            else:
+                compressed = compress(encoding, body)
+            if len(compressed) < len(body):
+                asset.add(encoding, compressed)
+        return asset
+
+    @staticmethod
+    def _negotiate(asset: Asset, accept_encoding: str) -> str:
+        accepted: dict[str, float] = {}
+        for part in accept_encoding.split(','):
+            coding, _, params = part.strip().partition(';')
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if coding:
+                accepted[coding.strip().lower()] = quality
+        for encoding, _ in ENCODINGS:
+            if encoding in asset.variants and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+                return encoding
+        return 'identity'
+
+
+def _files(directory: str) -> list[str]:
+    names = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            names.append(os.path.relpath(os.path.join(root, file), directory).replace(os.sep, '/'))
+    return names
+
+
+def _etags(if_none_match: str) -> set[str]:
+    # weak validators match too, as If-None-Match uses weak comparison
+    return {tag.strip().removeprefix('W/') for tag in if_none_match.split(',') if tag.strip()}
+
+
+if __name__ == '__main__':
+    import sys
+
+    for written in precompress(sys.argv[1] if len(sys.argv) > 1 else 'frontend_dist'):
+        print(written)
@@ -1,30 +1,129 @@
 import datetime
+import hashlib
+import re
 import uuid
 from http import HTTPStatus
 
 from fastapi import HTTPException
-from sqlalchemy import Engine, select
+from pydantic import BaseModel
+from sqlalchemy import ColumnElement, Engine, Integer, ScalarSelect, delete, func, insert, literal_column, or_, select, true, update
 from sqlalchemy.exc import DatabaseError
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.orm import Session, aliased
+from typing import Iterable, List, Optional
 
 import dto
 import model
+from .broker import StatusBroker, StatusEvent
+from .changes import Change, ChangeFeed
+from .pagination import Keyset
+from .cache import ReadCache
+from .planner import RunbookPlanner
+from .progress import ProgressCache, load_progress
+from .task_import import TaskStreamImport
+from .task_status import StatusRollup, count_subtask
+from .task_tree import TaskTree
+
+
+def insertion_order(session: Session) -> ColumnElement:
+    """
+    Sort key that lists tasks in the order they were created: the rowid on
+    SQLite (tasks are never deleted, so it only grows). Other databases have
+    no such key, and lists come in uuid order there.
+    """
+    if session.bind.dialect.name == 'sqlite':
+        return literal_column('tasks.rowid', Integer).label('rowid')
+    return model.Task.uuid
 
 
 class TaskService:
 
-    def __init__(self, db: Engine) -> None:
+    STATUS_STREAM_KEYSET = Keyset(model.TaskStatusUpdate.updated_at, model.TaskStatusUpdate.uuid)
+
+    def __init__(
+            self,
+            db: Engine,
+            broker: Optional[StatusBroker] = None,
+            cache: Optional[ReadCache] = None,
+            read_db: Optional[Engine] = None,
+            planner: Optional[RunbookPlanner] = None,
+            changes: Optional[ChangeFeed] = None,
+    ) -> None:
         self.db = db
+        # plain reads may go to a replica; loads that fill a cache
+        # stay on db, so a lagging replica cannot cache stale data
+        self.read_db = read_db or db
+        self.broker = broker
+        self.cache = cache or ReadCache()
+        self.progress = ProgressCache()
+        self.planner = planner or RunbookPlanner()
+        # set when other workers share the database and its state must be too
+        self.changes = changes
 
     def get(self, req: dto.TaskGetRequest) -> dto.TaskGetResponse:
-        with Session(self.db) as session:
-            task: Optional[model.Task] = session.query(model.Task).get(req.uuid)
-            if task is None:
-                raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='task not found')
-            return dto.TaskGetResponse(
-                task=dto.TaskDto.from_model(task, max_subtask_depth=req.max_subtasks_depth),
-            )
+        def load() -> dto.TaskDto:
+            with Session(self.db) as session:
+                tree = TaskTree.load(session, [req.uuid], max_depth=req.max_subtasks_depth)
+                if req.uuid not in tree:
+                    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='task not found')
+                return tree.to_dto(req.uuid, max_subtask_depth=req.max_subtasks_depth)
+
+        task = self.cache.get_or_load(
+            ('task', req.uuid, req.max_subtasks_depth), load, runbook_of=lambda task: task.runbook_uuid
+        )
+        progress: Optional[dto.TaskProgressDto] = None
+        if req.calculate_progress:
+            with Session(self.db) as session:
+                progress = self.task_progress(session, req.uuid, task.runbook_uuid)
+        return dto.TaskGetResponse(task=task, progress=progress)
+
+    def etag(self, req: BaseModel, runbook_uuid: Optional[str] = None, task_uuid: Optional[str] = None) -> Optional[str]:
+        """
+        ETag for a read of the tasks of one runbook: the one of task_uuid if
+        given, else runbook_uuid. Made of the runbook's persisted version and
+        a digest of the request; None when there is no such runbook or task.
+
+        Costs one primary key lookup (tasks never change runbook, so the
+        runbook of a task found is cached). Read from read_db before the
+        response is loaded, the version can only be older than the body it
+        is sent with, never newer, so a later match is never stale. That
+        holds for cached bodies too: a version this process has not seen
+        yet, e.g. after a change by another worker the change feed has not
+        brought over, first drops what is cached for the runbook.
+        """
+        if task_uuid is not None:
+            def load() -> str:
+                with Session(self.read_db) as session:
+                    found = session.scalar(select(model.Task.runbook_uuid).where(model.Task.uuid == task_uuid))
+                if found is None:
+                    # raised so it is not cached, the task may just not be
+                    # on a lagging read_db yet
+                    raise KeyError(task_uuid)
+                return found
+
+            try:
+                runbook_uuid = self.cache.get_or_load(('runbook_of', task_uuid), load)
+            except KeyError:
+                return None
+        if runbook_uuid is None:
+            return None
+        with Session(self.read_db) as session:
+            version = session.scalar(select(model.Runbook.version).where(model.Runbook.uuid == runbook_uuid))
+        if version is None:
+            return None
+        if not self.cache.versions.observed(runbook_uuid, version):
+            self.progress.invalidate_runbook(runbook_uuid)
+            self.cache.versions.bump(runbook_uuid)
+            self.cache.versions.observe(runbook_uuid, version)
+        digest = hashlib.sha1(f'{type(req).__name__}:{req.model_dump_json()}'.encode()).hexdigest()[:16]
+        return f'"{runbook_uuid}.{version}.{digest}"'
+
+    def task_progress(self, session: Session, task_uuid: str, runbook_uuid: str) -> dto.TaskProgressDto:
+        generation = self.progress.generation
+        progress = self.progress.get(task_uuid)
+        if progress is None:
+            progress = load_progress(session, task_uuid)
+            self.progress.put(task_uuid, runbook_uuid, progress, generation)
+        return progress
 
     def create(self, req: dto.TaskCreateRequest) -> dto.TaskCreateResponse:
         with Session(self.db) as session:
@@ -56,32 +155,46 @@ class TaskService:
                     dependency=depends_on,
                     runbook=runbook,
                 )
+                if parent is not None:
+                    count_subtask(parent, model.TaskStatus.NOT_STARTED, 1)
                 session.add(task)
+                # a new leaf changes the progress of all of its ancestors
+                ancestors = []
+                if parent is not None and (self.progress or self.changes):
+                    ancestors = list(TaskTree.parents(session, [parent.uuid]))
+                self.record_structure_change(session, req.runbook_uuid, ancestors)
             except DatabaseError:
                 session.rollback()
                 raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
             else:
                 session.commit()
+                self.structure_changed(req.runbook_uuid, ancestors)
                 return dto.TaskCreateResponse(
                     created=dto.TaskDto.from_model(task)
                 )
 
     def list(self, req: dto.TaskListRequest) -> dto.TaskListResponse:
-        with Session(self.db) as session:
-            stmt = select(model.Task).where(model.Task.runbook_uuid == req.runbook_uuid)
+        with Session(self.read_db) as session:
+            order = insertion_order(session)
+            stmt = select(model.Task.uuid, order).where(model.Task.runbook_uuid == req.runbook_uuid)
             if not req.flat:
                 stmt = stmt.where(model.Task.parent_task_uuid == None)
-            tasks = session.scalars(stmt)
+            keyset = Keyset(order)
+            stmt = keyset.apply(stmt, req.page_size, req.cursor)
+            rows, next_cursor = keyset.page(session.execute(stmt).all(), req.page_size, lambda row: (row[1],))
+            task_uuids = [task_uuid for task_uuid, _ in rows]
+
+            tree = TaskTree.load(session, task_uuids, max_depth=0) if task_uuids else TaskTree()
             return dto.TaskListResponse(
-                tasks=map(
-                    lambda task: dto.TaskDto.from_model(task, 0),
-                    tasks
-                )
+                tasks=[tree.to_dto(task_uuid, max_subtask_depth=0) for task_uuid in task_uuids],
+                next_cursor=next_cursor,
             )
 
     def list_with_status(self, req: dto.TaskListWithStatusRequest) -> dto.TaskListWithStatusResponse:
-        with Session(self.db) as session:
-            stmt = select(model.Task)
+        with Session(self.read_db) as session:
+            order = insertion_order(session)
+            stmt = select(model.Task, model.TaskStatusUpdate, order).\
+                outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid)
             if req.parent_task_uuid is not None:
                 stmt = stmt.where(model.Task.parent_task_uuid == req.parent_task_uuid)
             elif req.runbook_uuid is not None:
@@ -89,18 +202,72 @@ class TaskService:
                     where(model.Task.parent_task_uuid == None)
             else:
                 raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='at least one of runbook_uuid or parent_task_uuid must be privided')
+            keyset = Keyset(order)
+            stmt = keyset.apply(stmt, req.page_size, req.cursor)
 
-            tasks = session.scalars(stmt)
-            tasks_dto: list[dto.TaskWithStatusDto] = []
-            for task in tasks:
-                last_status_update: Optional[model.TaskStatusUpdate] = None
-                if task.last_status_uuid:
-                    last_status_update = session.query(model.TaskStatusUpdate).get(task.last_status_uuid)
-                tasks_dto.append(dto.TaskWithStatusDto.from_model(task, last_status_update))
+            rows, next_cursor = keyset.page(session.execute(stmt).all(), req.page_size, lambda row: (row[2],))
             return dto.TaskListWithStatusResponse(
-                tasks=tasks_dto
+                tasks=TaskService.with_status_dtos(session, [(task, status) for task, status, _ in rows]),
+                next_cursor=next_cursor,
             )
 
+    @staticmethod
+    def with_status_dtos(
+            session: Session,
+            rows: List[tuple[model.Task, Optional[model.TaskStatusUpdate]]],
+    ) -> List[dto.TaskWithStatusDto]:
+        dependency_uuids = {task.depends_on_task_uuid for task, _ in rows if task.depends_on_task_uuid}
+        dependencies = TaskTree.load(session, dependency_uuids, max_depth=0) if dependency_uuids else TaskTree()
+
+        tasks_dto: List[dto.TaskWithStatusDto] = []
+        for task, last_status_update in rows:
+            depends_on: Optional[dto.TaskDto] = None
+            if task.depends_on_task_uuid in dependencies:
+                depends_on = dependencies.to_dto(task.depends_on_task_uuid, max_subtask_depth=0)
+            tasks_dto.append(dto.TaskWithStatusDto.from_model(task, last_status_update, depends_on))
+        return tasks_dto
+
+    def search(self, req: dto.TaskSearchRequest) -> dto.TaskSearchResponse:
+        """
+        Ranked full-text search over task descriptions and status details,
+        answered from the FTS5 index (see model.task_search). A task whose
+        description and details match several times is one hit, ranked by
+        its best match.
+        """
+        if self.read_db.dialect.name != 'sqlite':
+            raise HTTPException(status_code=HTTPStatus.NOT_IMPLEMENTED, detail='task search needs SQLite')
+        terms = re.findall(r'\w+', req.query)
+        if not terms:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='query has no words to search for')
+        # every word quoted, so nothing in the query is read as FTS5 syntax
+        match = ' '.join(f'"{term}"' for term in terms) + '*'
+
+        with Session(self.read_db) as session:
+            index = model.task_search
+            hits = select(index.c.task_uuid, func.min(index.c.rank).label('rank')).\
+                where(index.c.content.match(match))
+            if req.runbook_uuid is not None:
+                hits = hits.where(index.c.runbook_uuid == req.runbook_uuid)
+            elif req.project_uuid is not None:
+                hits = hits.where(index.c.runbook_uuid.in_(
+                    select(model.Runbook.uuid).where(model.Runbook.project_uuid == req.project_uuid)
+                ))
+            hits = hits.group_by(index.c.task_uuid).subquery()
+
+            # the page is cut from the hits alone, so only its tasks get joined
+            keyset = Keyset(hits.c.rank, hits.c.task_uuid)
+            page = keyset.apply(select(hits), req.page_size, req.cursor).subquery()
+            stmt = select(model.Task, model.TaskStatusUpdate, page.c.rank).\
+                join(page, page.c.task_uuid == model.Task.uuid).\
+                outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid).\
+                order_by(page.c.rank, page.c.task_uuid)
+
+            rows, next_cursor = keyset.page(session.execute(stmt).all(), req.page_size, lambda row: (row[2], row[0].uuid))
+            tasks = TaskService.with_status_dtos(session, [(task, status) for task, status, _ in rows])
+            return dto.TaskSearchResponse(
+                hits=[dto.TaskSearchHitDto(task=task, rank=rank) for task, (_, _, rank) in zip(tasks, rows)],
+                next_cursor=next_cursor,
+            )
 
     @staticmethod
     def persist_task(
@@ -115,7 +282,8 @@ class TaskService:
             description=task.description,
             parent=parent,
             dependency=depends_on,
-            runbook_uuid=runbook.uuid
+            runbook_uuid=runbook.uuid,
+            subtasks_not_started=len(task.subtasks),
         )
         if task.subtasks:
             previous_subtask = None
@@ -150,104 +318,387 @@ class TaskService:
                         depends_on=previous_task
                     )
                     tasks.append(previous_task)
+                self.record_structure_change(session, req.runbook_uuid)
             except DatabaseError:
                 session.rollback()
                 raise
             else:
                 session.commit()
+                self.structure_changed(req.runbook_uuid)
                 return dto.TaskStructureImportResponse(
                     tasks=map(dto.TaskDto.from_model, tasks)
                 )
 
-    def get_status_updates(self, req: dto.TaskGetStatusUpdatesRequest) -> dto.TaskGetStatusUpdatesResponse:
+    def structure_import_bulk(self, req: dto.TaskStructureImportRequest) -> dto.TaskBulkImportResponse:
         with Session(self.db) as session:
-            stmt = select(model.TaskStatusUpdate). \
-                where(model.TaskStatusUpdate.task_uuid == req.task_uuid). \
-                order_by(model.TaskStatusUpdate.updated_at.desc()). \
-                limit(req.limit)
+            session.begin()
+            try:
+                runbook: Optional[model.Runbook] = session.query(model.Runbook).get(req.runbook_uuid)
+                if runbook is None:
+                    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='runbook not found')
 
-            updates = session.scalars(stmt)
+                importer = TaskStreamImport(session, runbook.uuid)
+                for line in TaskStreamImport.flatten(req.tasks):
+                    importer.add(line)
+                response = importer.finish()
+                self.record_structure_change(session, req.runbook_uuid)
+            except DatabaseError:
+                session.rollback()
+                raise
+            else:
+                session.commit()
+                self.structure_changed(req.runbook_uuid)
+                return response
+
+    def structure_changed(self, runbook_uuid: str, ancestors: Iterable[str] = ()):
+        """
+        To be called after committing new tasks or dependencies to a runbook.
+        ancestors are those of new subtasks of existing tasks.
+        """
+        self.cache.versions.bump(runbook_uuid)
+        self.planner.invalidate(runbook_uuid)
+        self.progress.invalidate(ancestors)
+
+    def statuses_changed(
+            self,
+            runbook_uuids: Iterable[str],
+            statuses: List[tuple[str, model.TaskStatus]],
+            parents: Iterable[str],
+            events: List[StatusEvent],
+    ):
+        """
+        To be called after committing status updates: statuses as written
+        (rollups included), the updated tasks with all of their ancestors and
+        the events for the broker.
+        """
+        self.cache.versions.bump(*runbook_uuids)
+        self.planner.update_statuses(statuses)
+        self.progress.invalidate(parents)
+        if events:
+            self.broker.publish(events)
+
+    def record_structure_change(self, session: Session, runbook_uuid: str, ancestors: Iterable[str] = ()):
+        self.bump_runbook_versions(session, [runbook_uuid])
+        self.record_change(session, 'structure', runbook_uuid=runbook_uuid, ancestors=list(ancestors))
+
+    @staticmethod
+    def bump_runbook_versions(session: Session, runbook_uuids: Optional[Iterable[str]]):
+        """
+        Bumps the persisted version of the runbooks (all of them if None), in
+        the transaction changing their tasks or statuses. ETags of task reads
+        derive from it.
+        """
+        stmt = update(model.Runbook).values(version=model.Runbook.version + 1)
+        if runbook_uuids is not None:
+            stmt = stmt.where(model.Runbook.uuid.in_(list(runbook_uuids)))
+        session.execute(stmt, execution_options={'synchronize_session': False})
+
+    def record_change(self, session: Session, kind: str, **payload):
+        """
+        Records a change for the other workers, in the transaction making it.
+        apply_change is what they do with it.
+        """
+        if self.changes is not None:
+            self.changes.record(session, kind, **payload)
+
+    def apply_change(self, change: Change):
+        payload = change.payload
+        if change.kind == 'structure':
+            self.structure_changed(payload['runbook_uuid'], payload.get('ancestors', ()))
+        elif change.kind == 'status':
+            events: List[StatusEvent] = []
+            if self.broker is not None:
+                events = [
+                    StatusEvent(event['runbook_uuid'], event['path'], dto.TaskStatusEventDto.model_validate(event['event']))
+                    for event in payload['events'] if self.broker.wants(event['runbook_uuid'])
+                ]
+            self.statuses_changed(
+                payload['runbook_uuids'],
+                [(task_uuid, model.TaskStatus(status)) for task_uuid, status in payload['statuses']],
+                payload['parents'],
+                events,
+            )
+        elif change.kind == 'counters':
+            self.progress.clear()
+
+    def reset(self):
+        """
+        Drops all in-process state, for when changes of other workers may
+        have been missed.
+        """
+        self.cache.clear()
+        self.planner.clear()
+        self.progress.clear()
+        if self.broker is not None:
+            self.broker.close_all()
+
+    def open_stream_import(self, runbook_uuid: str) -> TaskStreamImport:
+        """
+        Starts a streamed import in its own transaction. The caller feeds it
+        NDJSON lines, then commits, and must always close it.
+        """
+        session = Session(self.db)
+        session.begin()
+        runbook: Optional[model.Runbook] = session.query(model.Runbook).get(runbook_uuid)
+        if runbook is None:
+            session.close()
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='runbook not found')
+        return TaskStreamImport(
+            session,
+            runbook.uuid,
+            before_commit=lambda: self.record_structure_change(session, runbook_uuid),
+            on_commit=lambda: self.structure_changed(runbook_uuid),
+        )
+
+    def structure_import_stream(self, runbook_uuid: str, lines: Iterable[bytes]) -> dto.TaskBulkImportResponse:
+        """
+        Imports NDJSON lines, already received in full (see spool), in a
+        single transaction.
+        """
+        importer = self.open_stream_import(runbook_uuid)
+        try:
+            importer.feed(lines)
+            return importer.commit()
+        finally:
+            importer.close()
+
+    def get_status_updates(self, req: dto.TaskGetStatusUpdatesRequest) -> dto.TaskGetStatusUpdatesResponse:
+        with Session(self.read_db) as session:
+            keyset = Keyset(model.TaskStatusUpdate.updated_at, model.TaskStatusUpdate.uuid, descending=True)
+            stmt = keyset.apply(
+                select(model.TaskStatusUpdate).where(model.TaskStatusUpdate.task_uuid == req.task_uuid),
+                req.limit,
+                req.cursor,
+            )
+
+            updates = list(session.scalars(stmt))
+            if len(updates) <= req.limit:
+                # the archive only holds updates older than those of the same
+                # task left in task_status, so it simply continues the page
+                cursor = keyset.encode((updates[-1].updated_at, updates[-1].uuid)) if updates else req.cursor
+                archive = Keyset(model.TaskStatusArchive.updated_at, model.TaskStatusArchive.uuid, descending=True)
+                updates += session.scalars(archive.apply(
+                    select(model.TaskStatusArchive).where(model.TaskStatusArchive.task_uuid == req.task_uuid),
+                    req.limit - len(updates),
+                    cursor,
+                ))
+
+            updates, next_cursor = keyset.page(updates, req.limit, lambda update: (update.updated_at, update.uuid))
             return dto.TaskGetStatusUpdatesResponse(
-                updates=map(dto.TaskStatusUpdateDto.from_model, updates)
+                updates=map(dto.TaskStatusUpdateDto.from_model, updates),
+                next_cursor=next_cursor,
             )
 
+    def compact_status_history(self, req: dto.TaskCompactStatusHistoryRequest) -> dto.TaskCompactStatusHistoryResponse:
+        """
+        Moves status updates that are not the last status of their task to
+        task_status_archive: all of those of finished runbooks (every task
+        completed) and, with older_than_days, the older ones of any runbook.
+        Rows move in batches, each in its own transaction.
+        """
+        scope = true() if req.runbook_uuid is None else model.Task.runbook_uuid == req.runbook_uuid
+        with Session(self.db) as session:
+            unfinished = select(model.Task.runbook_uuid).\
+                outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid).\
+                where(scope).\
+                where(or_(model.TaskStatusUpdate.status == None, model.TaskStatusUpdate.status != model.TaskStatus.COMPLETED))
+            finished = session.scalars(
+                select(model.Task.runbook_uuid).distinct().where(scope).where(model.Task.runbook_uuid.not_in(unfinished))
+            ).all()
+
+        archivable = model.Task.runbook_uuid.in_(finished)
+        if req.older_than_days is not None:
+            cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=req.older_than_days)
+            archivable = or_(archivable, model.TaskStatusUpdate.updated_at < cutoff)
+        batch_stmt = select(model.TaskStatusUpdate.uuid).\
+            join(model.Task, model.Task.uuid == model.TaskStatusUpdate.task_uuid).\
+            where(scope).\
+            where(or_(model.Task.last_status_uuid == None, model.Task.last_status_uuid != model.TaskStatusUpdate.uuid)).\
+            where(archivable).\
+            limit(req.batch_size)
+
+        columns = ['uuid', 'task_uuid', 'status', 'detail', 'updated_at', 'updated_by']
+        archived = 0
+        while True:
+            with Session(self.db) as session:
+                session.begin()
+                try:
+                    batch = session.scalars(batch_stmt).all()
+                    if batch:
+                        session.execute(insert(model.TaskStatusArchive).from_select(
+                            columns,
+                            select(*(getattr(model.TaskStatusUpdate, column) for column in columns)).
+                            where(model.TaskStatusUpdate.uuid.in_(batch)),
+                        ))
+                        session.execute(
+                            delete(model.TaskStatusUpdate).where(model.TaskStatusUpdate.uuid.in_(batch)),
+                            execution_options={'synchronize_session': False},
+                        )
+                except DatabaseError:
+                    session.rollback()
+                    raise
+                else:
+                    session.commit()
+            archived += len(batch)
+            if len(batch) < req.batch_size:
+                return dto.TaskCompactStatusHistoryResponse(archived=archived, finished_runbooks=len(finished))
+
     def update_status(self, req: dto.TaskUpdateStatusRequest) -> dto.TaskUpdateStatusResponse:
         with Session(self.db) as session:
             try:
-                task: model.Task = session.query(model.Task).get(req.task_uuid)
-                if task is None:
-                    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='task not found')
-
-                update: model.TaskStatusUpdate = model.TaskStatusUpdate(
-                    uuid=str(uuid.uuid4()),
-                    task_uuid=req.task_uuid,
-                    status=req.status,
-                    detail=req.detail,
-                    updated_by=req.updated_by,
-                    updated_at=datetime.datetime.utcnow(),
-                )
-                task.last_status_uuid = update.uuid
-                session.add(update)
-                TaskService.update_parent_status(session, task)
+                rollup = StatusRollup(session)
+                update, = rollup.apply([req])
+                rollup.propagate()
+                events = self.status_events_for(rollup)
+                runbook_uuids = {task.runbook_uuid for task in rollup.tasks.values()}
+                statuses = [(update.task_uuid, update.status) for update in rollup.written]
+                self.record_status_change(session, runbook_uuids, statuses, rollup.parents, events)
             except DatabaseError:
                 session.rollback()
                 raise
             else:
                 session.commit()
+                self.statuses_changed(runbook_uuids, statuses, rollup.parents, events)
                 return dto.TaskUpdateStatusResponse(
                     update=dto.TaskStatusUpdateDto.from_model(update),
                 )
 
-    @staticmethod
-    def update_parent_status(session: Session, task: model.Task):
-        parent: model[model.Task] = task.parent
-        if parent is None:
-            return
-        status_count: dict[model.TaskStatus, int] = {
-            model.TaskStatus.NOT_STARTED: 0,
-            model.TaskStatus.IN_PROGRESS: 0,
-            model.TaskStatus.COMPLETED: 0,
-            model.TaskStatus.ERROR: 0,
-        }
-        total = 0
-        for sibling in parent.subtasks:
-            total += 1
-            if not sibling.last_status_uuid:
-                status_count[model.TaskStatus.NOT_STARTED] += 1
+    def update_status_batch(self, req: dto.TaskUpdateStatusBatchRequest) -> dto.TaskUpdateStatusBatchResponse:
+        """
+        Applies all updates in one transaction, then writes a single rollup
+        status for each affected ancestor instead of one per updated subtask.
+        """
+        with Session(self.db) as session:
+            try:
+                rollup = StatusRollup(session)
+                updates = rollup.apply(req.updates)
+                rollups = rollup.propagate()
+                events = self.status_events_for(rollup)
+                runbook_uuids = {task.runbook_uuid for task in rollup.tasks.values()}
+                statuses = [(update.task_uuid, update.status) for update in rollup.written]
+                self.record_status_change(session, runbook_uuids, statuses, rollup.parents, events)
+            except DatabaseError:
+                session.rollback()
+                raise
             else:
-                status: model.TaskStatusUpdate = session.query(model.TaskStatusUpdate).get(sibling.last_status_uuid)
-                status_count[status.status] += 1
-
-        new_parent_status: Optional[model.TaskStatus] = None
-        if status_count[model.TaskStatus.ERROR] != 0:
-            new_parent_status = model.TaskStatus.ERROR
-            new_detail = f'There are {status_count[model.TaskStatus.ERROR]} subtasks with errors'
-        elif status_count[model.TaskStatus.COMPLETED] == total:
-            new_parent_status = model.TaskStatus.COMPLETED
-            new_detail = f'{total}/{total} subtasks completed'
-        elif status_count[model.TaskStatus.NOT_STARTED] == total:
-            new_parent_status = model.TaskStatus.NOT_STARTED
-            new_detail = f'There are {total} not started subtasks'
-        else:
-            new_parent_status = model.TaskStatus.IN_PROGRESS
-            new_detail = f'{status_count[model.TaskStatus.COMPLETED]} completed, '
-            new_detail += f'{status_count[model.TaskStatus.IN_PROGRESS]} in progress,  '
-            new_detail += f'{status_count[model.TaskStatus.NOT_STARTED]} not started'
-
-        last_parent_status_update: model.TaskStatusUpdate = session.query(
-            model.TaskStatusUpdate
-        ).get(task.parent.last_status_uuid)
-        if last_parent_status_update is None and new_parent_status == model.TaskStatus.NOT_STARTED:
-            return
+                session.commit()
+                self.statuses_changed(runbook_uuids, statuses, rollup.parents, events)
+                return dto.TaskUpdateStatusBatchResponse(
+                    updates=map(dto.TaskStatusUpdateDto.from_model, updates),
+                    rollups=map(dto.TaskStatusUpdateDto.from_model, rollups),
+                )
 
-        parent_status_update = model.TaskStatusUpdate(
-            uuid=str(uuid.uuid4()),
-            task_uuid=parent.uuid,
-            status=new_parent_status,
-            detail=new_detail,
-            updated_by='Subtask change',
-            updated_at=datetime.datetime.utcnow(),
+    def record_status_change(
+            self,
+            session: Session,
+            runbook_uuids: Iterable[str],
+            statuses: List[tuple[str, model.TaskStatus]],
+            parents: Iterable[str],
+            events: List[StatusEvent],
+    ):
+        self.bump_runbook_versions(session, runbook_uuids)
+        if self.changes is None:
+            return
+        self.record_change(
+            session,
+            'status',
+            runbook_uuids=list(runbook_uuids),
+            statuses=[(task_uuid, status.value) for task_uuid, status in statuses],
+            parents=list(parents),
+            events=[
+                {'runbook_uuid': event.runbook_uuid, 'path': event.task_path, 'event': event.event.model_dump(mode='json')}
+                for event in events
+            ],
         )
-        parent.last_status_uuid = parent_status_update.uuid
-        session.add(parent_status_update)
-        TaskService.update_parent_status(session, parent)
+
+    def status_events_for(self, rollup: StatusRollup) -> List[StatusEvent]:
+        """
+        Builds broker events for everything the rollup wrote, or nothing if
+        nobody is listening to the affected runbooks. With other workers
+        sharing the database, their subscribers may be listening, so events
+        are always built.
+        """
+        if self.broker is None:
+            return []
+        events: List[StatusEvent] = []
+        for update in rollup.written:
+            runbook_uuid = rollup.tasks[update.task_uuid].runbook_uuid
+            if self.changes is None and not self.broker.wants(runbook_uuid):
+                continue
+            events.append(StatusEvent(runbook_uuid, rollup.path(update.task_uuid), dto.TaskStatusEventDto(
+                runbook_uuid=runbook_uuid,
+                update=dto.TaskStatusUpdateDto.from_model(update),
+                cursor=TaskService.STATUS_STREAM_KEYSET.encode((update.updated_at, update.uuid)),
+            )))
+        return events
+
+    def status_events(self, req: dto.TaskStatusEventsRequest) -> dto.TaskStatusEventsResponse:
+        """
+        Status updates of a runbook (or of one task's subtree) committed after
+        cursor, oldest first. Used to resume a status stream after reconnecting.
+        """
+        with Session(self.read_db) as session:
+            stmt = select(model.TaskStatusUpdate).\
+                join(model.Task, model.Task.uuid == model.TaskStatusUpdate.task_uuid).\
+                where(model.Task.runbook_uuid == req.runbook_uuid)
+            if req.task_uuid is not None:
+                stmt = stmt.where(model.Task.uuid.in_(TaskTree.subtree(req.task_uuid)))
+            keyset = TaskService.STATUS_STREAM_KEYSET
+            stmt = keyset.apply(stmt, req.limit, req.cursor)
+
+            updates, next_cursor = keyset.page(
+                session.scalars(stmt).all(), req.limit, lambda update: (update.updated_at, update.uuid)
+            )
+            return dto.TaskStatusEventsResponse(
+                events=[
+                    dto.TaskStatusEventDto(
+                        runbook_uuid=req.runbook_uuid,
+                        update=dto.TaskStatusUpdateDto.from_model(update),
+                        cursor=keyset.encode((update.updated_at, update.uuid)),
+                    )
+                    for update in updates
+                ],
+                next_cursor=next_cursor,
+            )
+
+    def rebuild_subtask_counters(self, req: dto.TaskRebuildSubtaskCountersRequest) -> dto.TaskRebuildSubtaskCountersResponse:
+        """
+        Recomputes the materialized subtask counters from task_status and
+        reports how many tasks had drifted. With verify_only nothing is written.
+        """
+        subtask = aliased(model.Task)
+        actual: dict[str, ScalarSelect] = {}
+        for status, column in model.SUBTASK_COUNTERS.items():
+            matches_status = model.TaskStatusUpdate.status == status
+            if status == model.TaskStatus.NOT_STARTED:
+                matches_status = or_(model.TaskStatusUpdate.uuid == None, matches_status)
+            actual[column] = select(func.count()).\
+                select_from(subtask).\
+                outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == subtask.last_status_uuid).\
+                where(subtask.parent_task_uuid == model.Task.uuid).\
+                where(matches_status).\
+                scalar_subquery()
+
+        scope = true() if req.runbook_uuid is None else model.Task.runbook_uuid == req.runbook_uuid
+        drifted_condition = or_(*(getattr(model.Task, column) != count for column, count in actual.items()))
+
+        with Session(self.db) as session:
+            session.begin()
+            try:
+                drifted = session.scalar(
+                    select(func.count()).select_from(model.Task).where(scope).where(drifted_condition)
+                )
+                if drifted and not req.verify_only:
+                    session.execute(
+                        update(model.Task).where(scope).where(drifted_condition).values(**actual)
+                    )
+                    self.bump_runbook_versions(session, [req.runbook_uuid] if req.runbook_uuid is not None else None)
+                    self.record_change(session, 'counters')
+            except DatabaseError:
+                session.rollback()
+                raise
+            else:
+                session.commit()
+                if drifted and not req.verify_only:
+                    self.progress.clear()
+                return dto.TaskRebuildSubtaskCountersResponse(drifted=drifted)
@@ -0,0 +1,204 @@
+import tempfile
+import uuid
+from http import HTTPStatus
+from typing import Annotated, Any, AsyncIterator, BinaryIO, Callable, Iterable, Iterator, Optional, Union
+
+from fastapi import HTTPException
+from pydantic import Discriminator, Tag, TypeAdapter, ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+import dto
+import model
+
+
+def _line_type(line: Any) -> str:
+    # lines without a type are tasks, as they were before exports existed
+    if isinstance(line, dict):
+        return line.get('type', 'task')
+    return getattr(line, 'type', 'task')
+
+
+# any line of a runbook export; only the task lines are imported
+_import_line = TypeAdapter(Annotated[
+    Union[
+        Annotated[dto.TaskImportLineDto, Tag('task')],
+        Annotated[dto.RunbookExportLineDto, Tag('runbook')],
+        Annotated[dto.TaskStatusExportLineDto, Tag('status')],
+    ],
+    Discriminator(_line_type),
+])
+
+
+class _OpenTask:
+    __slots__ = ('uuid', 'subtasks', 'last_subtask_uuid')
+
+    def __init__(self, task_uuid: str) -> None:
+        self.uuid = task_uuid
+        self.subtasks = 0
+        self.last_subtask_uuid: Optional[str] = None
+
+
+class TaskStreamImport:
+    """
+    Imports a task tree given as a pre-order sequence of TaskImportLineDto,
+    writing flat rows with batched executemany inserts.
+
+    Only the path from the root to the current task is kept in memory (plus
+    the keys of tasks that others may depend on), so the tree never has to be
+    held as a whole. Like structure_import, every task depends on its previous
+    sibling unless the line says otherwise.
+    """
+
+    def __init__(
+            self,
+            session: Session,
+            runbook_uuid: str,
+            batch_size: int = 1000,
+            before_commit: Optional[Callable[[], None]] = None,
+            on_commit: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.session = session
+        self.runbook_uuid = runbook_uuid
+        self.batch_size = batch_size
+        self.before_commit = before_commit
+        self.on_commit = on_commit
+
+        self.path: list[_OpenTask] = []
+        self.last_root_uuid: Optional[str] = None
+        self.root_uuids: list[str] = []
+        self.imported = 0
+
+        self.keys: dict[str, str] = {}
+        self.unresolved: dict[str, list[str]] = {}
+
+        self.rows: list[dict] = []
+        self.counter_updates: list[dict] = []
+        self.dependency_updates: list[dict] = []
+
+    def add(self, line: dto.TaskImportLineDto):
+        if line.depth > len(self.path):
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f'task {self.imported} is nested more than one level below the previous one',
+            )
+        while len(self.path) > line.depth:
+            self._close(self.path.pop())
+
+        parent = self.path[-1] if self.path else None
+        task_uuid = str(uuid.uuid4())
+
+        depends_on = parent.last_subtask_uuid if parent else self.last_root_uuid
+        if 'depends_on' in line.model_fields_set:
+            depends_on = None
+            if line.depends_on is not None:
+                depends_on = self.keys.get(line.depends_on)
+                if depends_on is None:
+                    # forward reference, patched once the key shows up
+                    self.unresolved.setdefault(line.depends_on, []).append(task_uuid)
+
+        self.rows.append({
+            'uuid': task_uuid,
+            'description': line.description,
+            'runbook_uuid': self.runbook_uuid,
+            'parent_task_uuid': parent and parent.uuid,
+            'depends_on_task_uuid': depends_on,
+        })
+        self.imported += 1
+
+        if parent is not None:
+            parent.subtasks += 1
+            parent.last_subtask_uuid = task_uuid
+        else:
+            self.last_root_uuid = task_uuid
+            self.root_uuids.append(task_uuid)
+        self.path.append(_OpenTask(task_uuid))
+
+        if line.key is not None:
+            self.keys[line.key] = task_uuid
+            for dependant_uuid in self.unresolved.pop(line.key, ()):
+                self.dependency_updates.append({'uuid': dependant_uuid, 'depends_on_task_uuid': task_uuid})
+
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def feed(self, lines: Iterable[bytes]):
+        """
+        Adds tasks from raw NDJSON lines. Blank lines and the runbook and
+        status lines of an export are ignored.
+        """
+        for raw in lines:
+            if not raw.strip():
+                continue
+            try:
+                line = _import_line.validate_json(raw)
+            except ValidationError as e:
+                raise HTTPException(
+                    status_code=HTTPStatus.BAD_REQUEST,
+                    detail=f'invalid task at line {self.imported + 1}: {e.errors()[0]["msg"]}',
+                )
+            if isinstance(line, dto.TaskImportLineDto):
+                self.add(line)
+
+    def flush(self):
+        # rows go first, so counter and dependency patches always find their target
+        if self.rows:
+            self.session.execute(insert(model.Task), self.rows)
+            self.rows = []
+        if self.counter_updates:
+            self.session.execute(update(model.Task), self.counter_updates)
+            self.counter_updates = []
+        if self.dependency_updates:
+            self.session.execute(update(model.Task), self.dependency_updates)
+            self.dependency_updates = []
+
+    def finish(self) -> dto.TaskBulkImportResponse:
+        while self.path:
+            self._close(self.path.pop())
+        if self.unresolved:
+            missing = next(iter(self.unresolved))
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f'depends_on key {missing} not found')
+        self.flush()
+        return dto.TaskBulkImportResponse(imported=self.imported, root_uuids=self.root_uuids)
+
+    def commit(self) -> dto.TaskBulkImportResponse:
+        response = self.finish()
+        if self.before_commit is not None:
+            self.before_commit()
+        self.session.commit()
+        if self.on_commit is not None:
+            self.on_commit()
+        return response
+
+    def close(self):
+        self.session.close()
+
+    def _close(self, task: _OpenTask):
+        if task.subtasks:
+            self.counter_updates.append({'uuid': task.uuid, 'subtasks_not_started': task.subtasks})
+
+    @staticmethod
+    def flatten(tasks: list[dto.TaskInDto]) -> Iterator[dto.TaskImportLineDto]:
+        stack: list[tuple[int, dto.TaskInDto]] = [(0, task) for task in reversed(tasks)]
+        while stack:
+            depth, task = stack.pop()
+            yield dto.TaskImportLineDto(description=task.description, depth=depth)
+            stack.extend((depth + 1, subtask) for subtask in reversed(task.subtasks))
+
+
+async def spool(chunks: AsyncIterator[bytes], max_memory: int = 8 * 1024 * 1024) -> BinaryIO:
+    """
+    Receives a streamed request body in full, in memory up to max_memory and
+    in a temporary file beyond, and returns it rewound. Imports read it from
+    there, so their transaction never waits on a slow upload while holding
+    the write lock.
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        async for chunk in chunks:
+            body.write(chunk)
+        body.seek(0)
+    except BaseException:
+        body.close()
+        raise
+    return body
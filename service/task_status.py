@@ -0,0 +1,158 @@
+import datetime
+import heapq
+import uuid
+from http import HTTPStatus
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import dto
+import model
+from .task_tree import TaskTree
+
+
+def count_subtask(parent: model.Task, status: model.TaskStatus, delta: int):
+    column = model.SUBTASK_COUNTERS[status]
+    # applied as "column = column + delta" so concurrent updates to
+    # siblings cannot overwrite each other's deltas
+    setattr(parent, column, getattr(model.Task, column) + delta)
+
+
+def rollup_status(status_count: dict[model.TaskStatus, int]) -> tuple[model.TaskStatus, str]:
+    """
+    Status and detail of a parent task, given how many of its subtasks are in
+    each status.
+    """
+    total = sum(status_count.values())
+    if status_count[model.TaskStatus.ERROR] != 0:
+        return model.TaskStatus.ERROR, f'There are {status_count[model.TaskStatus.ERROR]} subtasks with errors'
+    if status_count[model.TaskStatus.COMPLETED] == total:
+        return model.TaskStatus.COMPLETED, f'{total}/{total} subtasks completed'
+    if status_count[model.TaskStatus.NOT_STARTED] == total:
+        return model.TaskStatus.NOT_STARTED, f'There are {total} not started subtasks'
+    detail = f'{status_count[model.TaskStatus.COMPLETED]} completed, '
+    detail += f'{status_count[model.TaskStatus.IN_PROGRESS]} in progress,  '
+    detail += f'{status_count[model.TaskStatus.NOT_STARTED]} not started'
+    return model.TaskStatus.IN_PROGRESS, detail
+
+
+class StatusRollup:
+    """
+    Applies status updates within one session and rolls them up the task tree.
+
+    Explicit updates are written in order and only adjust their parent's
+    subtask counters. propagate() then recomputes every affected ancestor
+    exactly once, deepest first, writing a single rollup status per ancestor
+    no matter how many of its descendants changed.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self.parents: dict[str, Optional[str]] = {}
+        self.tasks: dict[str, model.Task] = {}
+        self.statuses: dict[str, model.TaskStatus] = {}
+        self.written: list[model.TaskStatusUpdate] = []
+
+        self._depths: dict[str, int] = {}
+        self._deltas: dict[str, dict[model.TaskStatus, int]] = {}
+        self._queue: list[tuple[int, str]] = []
+
+    def apply(self, updates: list[dto.TaskUpdateStatusRequest]) -> list[model.TaskStatusUpdate]:
+        self._load({update.task_uuid for update in updates})
+
+        applied: list[model.TaskStatusUpdate] = []
+        for req in updates:
+            task = self.tasks[req.task_uuid]
+            update = model.TaskStatusUpdate(
+                uuid=str(uuid.uuid4()),
+                task_uuid=task.uuid,
+                status=req.status,
+                detail=req.detail,
+                updated_by=req.updated_by,
+                updated_at=datetime.datetime.utcnow(),
+            )
+            self._write(task, update)
+            applied.append(update)
+        return applied
+
+    def propagate(self) -> list[model.TaskStatusUpdate]:
+        rollups: list[model.TaskStatusUpdate] = []
+        while self._queue:
+            _, parent_uuid = heapq.heappop(self._queue)
+            parent = self.tasks[parent_uuid]
+            deltas = self._deltas.pop(parent_uuid)
+            for status, delta in deltas.items():
+                if delta:
+                    count_subtask(parent, status, delta)
+            if any(deltas.values()):
+                self.session.flush()
+
+            new_status, new_detail = rollup_status(parent.subtask_counts())
+            if not parent.last_status_uuid and new_status == model.TaskStatus.NOT_STARTED:
+                continue
+
+            update = model.TaskStatusUpdate(
+                uuid=str(uuid.uuid4()),
+                task_uuid=parent.uuid,
+                status=new_status,
+                detail=new_detail,
+                updated_by=model.ROLLUP_UPDATED_BY,
+                updated_at=datetime.datetime.utcnow(),
+            )
+            self._write(parent, update)
+            rollups.append(update)
+        return rollups
+
+    def path(self, task_uuid: str) -> list[str]:
+        """
+        The task followed by its parent, grandparent, ... up to the root.
+        """
+        path: list[str] = []
+        current: Optional[str] = task_uuid
+        while current is not None:
+            path.append(current)
+            current = self.parents.get(current)
+        return path
+
+    def _load(self, task_uuids: set[str]):
+        self.parents.update(TaskTree.parents(self.session, task_uuids))
+        missing = task_uuids - self.parents.keys()
+        if missing:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f'task not found: {", ".join(sorted(missing))}')
+
+        rows = self.session.execute(
+            select(model.Task, model.TaskStatusUpdate.status).
+            outerjoin(model.TaskStatusUpdate, model.TaskStatusUpdate.uuid == model.Task.last_status_uuid).
+            where(model.Task.uuid.in_(self.parents.keys() - self.tasks.keys()))
+        )
+        for task, status in rows:
+            self.tasks[task.uuid] = task
+            self.statuses[task.uuid] = status or model.TaskStatus.NOT_STARTED
+
+    def _write(self, task: model.Task, update: model.TaskStatusUpdate):
+        previous_status = self.statuses[task.uuid]
+        task.last_status_uuid = update.uuid
+        self.session.add(update)
+        self.statuses[task.uuid] = update.status
+        self.written.append(update)
+
+        parent_uuid = task.parent_task_uuid
+        if parent_uuid is None:
+            return
+        deltas = self._deltas.get(parent_uuid)
+        if deltas is None:
+            deltas = self._deltas[parent_uuid] = dict.fromkeys(model.TaskStatus, 0)
+            heapq.heappush(self._queue, (-self._depth(parent_uuid), parent_uuid))
+        if previous_status != update.status:
+            deltas[previous_status] -= 1
+            deltas[update.status] += 1
+
+    def _depth(self, task_uuid: str) -> int:
+        depth = self._depths.get(task_uuid)
+        if depth is None:
+            parent_uuid = self.parents[task_uuid]
+            depth = 0 if parent_uuid is None else self._depth(parent_uuid) + 1
+            self._depths[task_uuid] = depth
+        return depth
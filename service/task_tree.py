@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+from sqlalchemy import Row, Select, and_, case, literal, null, or_, select, true
+from sqlalchemy.orm import Session
+
+import dto
+import model
+
+
+class TaskTree:
+    """
+    In-memory index of a task subtree, loaded with a single recursive query.
+
+    Besides the subtree itself (down to max_depth levels below the roots), the
+    query follows parent_task_uuid and depends_on_task_uuid links transitively,
+    because TaskDto embeds the parent and dependency of every task it renders.
+    Building DTOs from the tree never touches the database.
+    """
+
+    def __init__(self) -> None:
+        self.tasks: dict[str, Row] = {}
+        self.children: dict[str, dict[str, None]] = {}
+        self._links: dict[str, dto.TaskDto] = {}
+
+    def __contains__(self, task_uuid: str) -> bool:
+        return task_uuid in self.tasks
+
+    @staticmethod
+    def load(session: Session, roots: Iterable[str], max_depth: Optional[int] = None) -> TaskTree:
+        tasks = model.Task.__table__
+        linked = tasks.alias('linked')
+        columns = (tasks.c.uuid, tasks.c.description, tasks.c.runbook_uuid,
+                   tasks.c.parent_task_uuid, tasks.c.depends_on_task_uuid)
+
+        tree = select(*columns, literal(0).label('depth')).\
+            where(tasks.c.uuid.in_(list(roots))).\
+            cte('tree', recursive=True)
+
+        # rows reached through a link get a NULL depth so they are never expanded
+        is_child = and_(
+            linked.c.parent_task_uuid == tree.c.uuid,
+            tree.c.depth.is_not(None),
+            tree.c.depth < max_depth if max_depth is not None else true(),
+        )
+        is_link = or_(
+            linked.c.uuid == tree.c.parent_task_uuid,
+            linked.c.uuid == tree.c.depends_on_task_uuid,
+        )
+        tree = tree.union(
+            select(
+                *(linked.c[column.name] for column in columns),
+                case((is_child, tree.c.depth + 1), else_=null()).label('depth'),
+            ).join_from(tree, linked, or_(is_child, is_link))
+        )
+
+        result = TaskTree()
+        for row in session.execute(select(tree)):
+            result.tasks.setdefault(row.uuid, row)
+            if row.depth:
+                result.children.setdefault(row.parent_task_uuid, {})[row.uuid] = None
+        return result
+
+    @staticmethod
+    def parents(session: Session, task_uuids: Iterable[str]) -> dict[str, Optional[str]]:
+        """
+        Maps each of the tasks and all of their ancestors to its parent uuid.
+        """
+        tasks = model.Task.__table__
+        parent = tasks.alias('parent')
+        path = select(tasks.c.uuid, tasks.c.parent_task_uuid).\
+            where(tasks.c.uuid.in_(list(task_uuids))).\
+            cte('path', recursive=True)
+        path = path.union(
+            select(parent.c.uuid, parent.c.parent_task_uuid).
+            join_from(path, parent, parent.c.uuid == path.c.parent_task_uuid)
+        )
+        return dict(session.execute(select(path.c.uuid, path.c.parent_task_uuid)).all())
+
+    @staticmethod
+    def subtree(task_uuid: str) -> Select:
+        """
+        Selects the uuids of the task and all of its descendants.
+        """
+        tasks = model.Task.__table__
+        child = tasks.alias('child')
+        subtree = select(tasks.c.uuid).where(tasks.c.uuid == task_uuid).cte('subtree', recursive=True)
+        subtree = subtree.union_all(
+            select(child.c.uuid).join_from(subtree, child, child.c.parent_task_uuid == subtree.c.uuid)
+        )
+        return select(subtree.c.uuid)
+
+    def to_dto(self, task_uuid: str, max_subtask_depth: Optional[int] = None) -> dto.TaskDto:
+        """
+        Same shape as TaskDto.from_model(task, max_subtask_depth), and likewise
+        constructed without validation.
+        """
+        if max_subtask_depth == 0:
+            return self._link(task_uuid)
+        task = self.tasks[task_uuid]
+        next_depth = max_subtask_depth - 1 if max_subtask_depth is not None else None
+        return dto.TaskDto.model_construct(
+            uuid=task.uuid,
+            description=task.description,
+            subtasks=[self.to_dto(subtask, next_depth) for subtask in self.children.get(task_uuid, ())],
+            runbook_uuid=task.runbook_uuid,
+            depends_on=self._optional_link(task.depends_on_task_uuid),
+            parent=self._optional_link(task.parent_task_uuid),
+        )
+
+    def _optional_link(self, task_uuid: Optional[str]) -> Optional[dto.TaskDto]:
+        if task_uuid is None or task_uuid not in self.tasks:
+            return None
+        return self._link(task_uuid)
+
+    def _link(self, task_uuid: str) -> dto.TaskDto:
+        # depth 0 renderings repeat a lot (every sibling embeds the same parent),
+        # so they are built once and shared
+        link = self._links.get(task_uuid)
+        if link is None:
+            task = self.tasks[task_uuid]
+            link = dto.TaskDto.model_construct(
+                uuid=task.uuid,
+                description=task.description,
+                subtasks=[],
+                runbook_uuid=task.runbook_uuid,
+                depends_on=self._optional_link(task.depends_on_task_uuid),
+                parent=self._optional_link(task.parent_task_uuid),
+            )
+            self._links[task_uuid] = link
+        return link
@@ -1,41 +1,96 @@
 CREATE TABLE IF NOT EXISTS projects (
     uuid TEXT PRIMARY KEY,
-    name TEXT NOT NULL UNIQUE
+    name TEXT NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS runbooks (
     uuid TEXT PRIMARY KEY,
-    name TEXT,
-    source TEXT,
-    target TEXT,
-    project_uuid TEXT,
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    project_uuid TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
 
-    FOREIGN KEY(project_uuid) REFERENCES projects(uuid)
+    FOREIGN KEY (project_uuid) REFERENCES projects(uuid)
 );
 
+CREATE INDEX IF NOT EXISTS ix_runbooks_project_uuid ON runbooks (project_uuid, uuid);
+
 CREATE TABLE IF NOT EXISTS tasks (
     uuid TEXT PRIMARY KEY,
     description TEXT NOT NULL,
 
-    runbook_uuid TEXT,
+    runbook_uuid TEXT NOT NULL,
     parent_task_uuid TEXT,
     depends_on_task_uuid TEXT,
     last_status_uuid TEXT,
 
-    FOREIGN KEY (runbook_uuid) REFERENCES  runbooks(uuid),
+    subtasks_not_started INTEGER NOT NULL DEFAULT 0,
+    subtasks_in_progress INTEGER NOT NULL DEFAULT 0,
+    subtasks_completed INTEGER NOT NULL DEFAULT 0,
+    subtasks_error INTEGER NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (runbook_uuid) REFERENCES runbooks(uuid),
     FOREIGN KEY (parent_task_uuid) REFERENCES tasks(uuid),
-    FOREIGN KEY (depends_on_task_uuid) REFERENCES tasks(uuid),
-    FOREIGN KEY (last_status_uuid) REFERENCES task_status(uuid)
+    FOREIGN KEY (depends_on_task_uuid) REFERENCES tasks(uuid)
 );
 
+CREATE INDEX IF NOT EXISTS ix_tasks_runbook_uuid_parent ON tasks (runbook_uuid, parent_task_uuid, uuid);
+CREATE INDEX IF NOT EXISTS ix_tasks_runbook_uuid_rowid ON tasks (runbook_uuid);
+CREATE INDEX IF NOT EXISTS ix_tasks_runbook_uuid_parent_rowid ON tasks (runbook_uuid, parent_task_uuid);
+CREATE INDEX IF NOT EXISTS ix_tasks_parent_task_uuid ON tasks (parent_task_uuid);
+CREATE INDEX IF NOT EXISTS ix_tasks_depends_on_task_uuid ON tasks (depends_on_task_uuid);
+
 CREATE TABLE IF NOT EXISTS task_status (
     uuid TEXT PRIMARY KEY,
-    task_uuid TEXT,
+    task_uuid TEXT NOT NULL,
     status TEXT NOT NULL,
     detail TEXT NOT NULL,
-    updated_at DATETIME,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_by TEXT,
 
-    FOREIGN KEY (task_uuid) REFERENCES tasks(uuid),
-    UNIQUE (task_uuid, updated_at)
+    FOREIGN KEY (task_uuid) REFERENCES tasks(uuid)
 );
+
+CREATE INDEX IF NOT EXISTS ix_task_status_task_uuid_updated_at ON task_status (task_uuid, updated_at, uuid);
+
+CREATE TABLE IF NOT EXISTS task_status_archive (
+    task_uuid TEXT NOT NULL,
+    updated_at DATETIME NOT NULL,
+    uuid TEXT NOT NULL,
+    status TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    updated_by TEXT,
+
+    PRIMARY KEY (task_uuid, updated_at, uuid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- full-text search over task descriptions and explicit status details,
+-- kept in sync by triggers (see model/search.py)
+CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5(
+    content,
+    task_uuid UNINDEXED,
+    runbook_uuid UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS task_search_tasks_insert AFTER INSERT ON tasks
+BEGIN
+    INSERT INTO task_search (content, task_uuid, runbook_uuid)
+    VALUES (new.description, new.uuid, new.runbook_uuid);
+END;
+
+CREATE TRIGGER IF NOT EXISTS task_search_task_status_insert AFTER INSERT ON task_status
+WHEN new.updated_by IS NOT 'Subtask change' AND new.detail != ''
+BEGIN
+    INSERT INTO task_search (content, task_uuid, runbook_uuid)
+    SELECT new.detail, uuid, runbook_uuid FROM tasks WHERE uuid = new.task_uuid;
+END;
@@ -0,0 +1,72 @@
+import contextlib
+import logging
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import Engine, text
+from sqlalchemy.orm import Session, configure_mappers
+
+import dto
+import model
+import service
+from service.progress import load_progress
+
+
+logger = logging.getLogger('waverunner.startup')
+
+
+def prepare_database(db: Engine):
+    """
+    One-time startup step: brings the schema up to the current models and
+    backfills the subtask counters if their columns were just added. Run it
+    once per deployment, before any worker serves requests.
+    """
+    if any(column.startswith('tasks.subtasks_') for column in model.upgrade(db)):
+        service.TaskService(db=db).rebuild_subtask_counters(dto.TaskRebuildSubtaskCountersRequest())
+
+
+def warm_up(
+        engines: list[Engine],
+        project_service: service.ProjectService,
+        runbook_service: service.RunbookService,
+        task_service: service.TaskService,
+        connections: int,
+):
+    """
+    Does up front what the first requests of a fresh process would otherwise
+    pay for: configures the mappers, opens up to connections pooled
+    connections per engine and runs every hot read once, for a uuid that
+    does not exist, so SQLAlchemy has their statements compiled and cached.
+    Nothing found is cached by the services.
+    """
+    configure_mappers()
+    for engine in dict.fromkeys(engines):
+        with contextlib.ExitStack() as stack:
+            # held together, so each one is a new connection up to the pool size
+            for _ in range(connections):
+                stack.enter_context(engine.connect()).execute(text('SELECT 1'))
+
+    missing = str(uuid.uuid4())
+    reads = (
+        lambda: project_service.get(dto.ProjectGetRequest(uuid=missing)),
+        lambda: project_service.list(dto.ProjectListRequest(page_size=1)),
+        lambda: project_service.summary(dto.ProjectSummaryRequest(uuid=missing)),
+        lambda: runbook_service.get(dto.RunbookGetRequest(uuid=missing)),
+        lambda: runbook_service.list(dto.RunbookListRequest(project_uuid=missing)),
+        lambda: task_service.get(dto.TaskGetRequest(uuid=missing)),
+        lambda: task_service.list(dto.TaskListRequest(runbook_uuid=missing)),
+        lambda: task_service.list_with_status(dto.TaskListWithStatusRequest(runbook_uuid=missing)),
+        lambda: task_service.list_with_status(dto.TaskListWithStatusRequest(parent_task_uuid=missing)),
+        lambda: task_service.get_status_updates(dto.TaskGetStatusUpdatesRequest(task_uuid=missing)),
+        lambda: task_service.status_events(dto.TaskStatusEventsRequest(runbook_uuid=missing)),
+        lambda: task_service.etag(dto.TaskListRequest(runbook_uuid=missing), runbook_uuid=missing),
+        lambda: task_service.etag(dto.TaskGetRequest(uuid=missing), task_uuid=missing),
+        lambda: task_service.search(dto.TaskSearchRequest(query=missing, runbook_uuid=missing)),
+    )
+    for read in reads:
+        try:
+            read()
+        except HTTPException:
+            pass
+    with Session(task_service.db) as session:
+        load_progress(session, missing)
@@ -0,0 +1,12 @@
+import pytest
+from sqlalchemy import Engine, create_engine
+
+import model
+
+
+@pytest.fixture
+def db(tmp_path) -> Engine:
+    engine = create_engine(f'sqlite:///{tmp_path / "test.db"}')
+    model.upgrade(engine)
+    yield engine
+    engine.dispose()
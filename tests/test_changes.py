@@ -0,0 +1,66 @@
+import json
+
+from sqlalchemy import Engine, insert
+from sqlalchemy.orm import Session
+
+import model
+from service.changes import Change, ChangeFeed
+
+
+class Listener:
+
+    def __init__(self) -> None:
+        self.changes: list[dict] = []
+        self.resets = 0
+
+    def apply_change(self, change: Change):
+        self.changes.append(change.payload)
+
+    def reset(self):
+        self.resets += 1
+
+
+def commit_change(db: Engine, seq: int):
+    # as another worker would, with the seq it got at insert
+    with Session(db) as session:
+        session.execute(insert(model.Change).values(
+            seq=seq, origin='other', kind='structure', payload=json.dumps({'seq': seq}),
+        ))
+        session.commit()
+
+
+def test_poll_applies_changes_committed_out_of_order(db: Engine):
+    commit_change(db, 9)
+    listener = Listener()
+    feed = ChangeFeed(db)
+    feed.listener = listener
+    feed.poll()
+
+    # seq 11 commits before seq 10
+    commit_change(db, 11)
+    feed.poll()
+    commit_change(db, 10)
+    feed.poll()
+    commit_change(db, 12)
+    feed.poll()
+
+    assert [change['seq'] for change in listener.changes] == [11, 10, 12]
+    assert listener.resets == 0
+    assert feed.last_seq == 12 and not feed.seen and not feed.gaps
+
+
+def test_poll_resets_after_waiting_out_a_gap(db: Engine):
+    commit_change(db, 9)
+    listener = Listener()
+    feed = ChangeFeed(db, gap_timeout=0.0)
+    feed.listener = listener
+    feed.poll()
+
+    # seq 10 was rolled back
+    commit_change(db, 11)
+    feed.poll()
+    feed.poll()
+
+    assert [change['seq'] for change in listener.changes] == [11]
+    assert listener.resets == 1
+    assert feed.last_seq == 11 and not feed.seen and not feed.gaps
@@ -0,0 +1,228 @@
+"""
+Query plans of the hot paths: every test runs the service call behind an
+endpoint against a freshly migrated database, asks SQLite for the EXPLAIN
+QUERY PLAN of every statement it issues and fails if any of them scans a
+whole table, which usually means an index went missing.
+
+Scans of CTEs, subqueries and the search index are fine, they are bounded
+by what feeds them.
+"""
+import re
+from types import SimpleNamespace
+from typing import Callable
+
+import pytest
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.orm import Session
+
+import dto
+import model
+import service
+
+
+SCAN = re.compile(r'^SCAN (\w+)')
+# an automatic index is built by scanning the table on every execution
+AUTOMATIC_INDEX = re.compile(r'^SEARCH (\w+) USING AUTOMATIC')
+ALIAS = re.compile(r'\b(\w+) AS (\w+)')
+
+
+class StatementLog:
+
+    def __init__(self, engine: Engine) -> None:
+        self.statements: dict[str, tuple] = {}
+        event.listen(engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0]
+        self.statements.setdefault(statement, tuple(parameters))
+
+    def take(self) -> dict[str, tuple]:
+        statements, self.statements = self.statements, {}
+        return statements
+
+
+def full_scans(plan: list[str], statement: str) -> list[str]:
+    tables = {name: name for name in model.Base.metadata.tables}
+    for table, alias in ALIAS.findall(statement):
+        if table in tables:
+            tables[alias] = table
+    scanned: list[str] = []
+    for detail in plan:
+        match = SCAN.match(detail) or AUTOMATIC_INDEX.match(detail)
+        if match and match.group(1) in tables:
+            scanned.append(tables[match.group(1)])
+    return scanned
+
+
+@pytest.fixture(scope='module')
+def hot(tmp_path_factory) -> SimpleNamespace:
+    engine = create_engine(f'sqlite:///{tmp_path_factory.mktemp("plans") / "plans.db"}')
+    model.upgrade(engine)
+
+    projects = service.ProjectService(engine)
+    runbooks = service.RunbookService(engine)
+    tasks = service.TaskService(engine)
+
+    project = projects.create(dto.ProjectCreateRequest(name='plans')).created
+    runbook = runbooks.create(dto.RunbookCreateRequest(
+        project_uuid=project.uuid, name='plans', source='a', target='b',
+    )).created
+    imported = tasks.structure_import(dto.TaskStructureImportRequest.model_validate({
+        'runbook_uuid': runbook.uuid,
+        'tasks': [
+            {'description': f'task {i}', 'subtasks': [
+                {'description': f'task {i}.{j}', 'subtasks': []} for j in range(3)
+            ]} for i in range(3)
+        ],
+    })).tasks
+    root = imported[0]
+    leaf = root.subtasks[0]
+    for status in ('IN_PROGRESS', 'COMPLETED'):
+        tasks.update_status(dto.TaskUpdateStatusRequest(task_uuid=leaf.uuid, status=status, detail=status))
+
+    yield SimpleNamespace(
+        engine=engine,
+        log=StatementLog(engine),
+        projects=projects,
+        runbooks=runbooks,
+        tasks=tasks,
+        project=project,
+        runbook=runbook,
+        root=root,
+        leaf=leaf,
+        status_cursor=tasks.get_status_updates(
+            dto.TaskGetStatusUpdatesRequest(task_uuid=leaf.uuid, limit=1),
+        ).next_cursor,
+        task_cursor=tasks.list(dto.TaskListRequest(runbook_uuid=runbook.uuid, page_size=1)).next_cursor,
+    )
+    engine.dispose()
+
+
+def assert_no_full_scans(hot: SimpleNamespace, call: Callable[[], object], allowed_scans: tuple[str, ...] = ()):
+    """
+    allowed_scans are the tables the call is expected to walk in full, e.g.
+    for an unfiltered list.
+    """
+    hot.log.take()
+    call()
+    failures: list[str] = []
+    for statement, parameters in hot.log.take().items():
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            continue
+        connection = hot.engine.raw_connection()
+        try:
+            plan = [row[3] for row in connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+        finally:
+            connection.close()
+        scanned = [table for table in full_scans(plan, statement) if table not in allowed_scans]
+        if scanned:
+            failures.append('\n'.join([f'SCAN {", ".join(scanned)}: {" ".join(statement.split())}', *plan]))
+    assert not failures, '\n\n'.join(failures)
+
+
+def test_project_list(hot):
+    assert_no_full_scans(hot, lambda: hot.projects.list(dto.ProjectListRequest()), allowed_scans=('projects',))
+
+
+def test_project_summary(hot):
+    assert_no_full_scans(hot, lambda: hot.projects.summary(dto.ProjectSummaryRequest(uuid=hot.project.uuid)))
+
+
+def test_runbook_list(hot):
+    assert_no_full_scans(hot, lambda: hot.runbooks.list(dto.RunbookListRequest(
+        project_uuid=hot.project.uuid, page_size=1,
+    )))
+
+
+def test_runbook_plan(hot):
+    assert_no_full_scans(hot, lambda: hot.runbooks.plan(dto.RunbookPlanRequest(uuid=hot.runbook.uuid)))
+
+
+def test_task_create(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.create(dto.TaskCreateRequest(
+        runbook_uuid=hot.runbook.uuid, description='created', parent=hot.root.uuid, depends_on=hot.leaf.uuid,
+    )))
+
+
+def test_task_get(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.get(dto.TaskGetRequest(uuid=hot.root.uuid, calculate_progress=True)))
+
+
+def test_task_subtasks_lazy_load(hot):
+    def lazy_subtasks():
+        with Session(hot.engine) as session:
+            return len(session.get(model.Task, hot.root.uuid).subtasks)
+
+    assert_no_full_scans(hot, lazy_subtasks)
+
+
+def test_task_list(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.list(dto.TaskListRequest(runbook_uuid=hot.runbook.uuid)))
+
+
+def test_task_list_next_page(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.list(dto.TaskListRequest(
+        runbook_uuid=hot.runbook.uuid, page_size=1, cursor=hot.task_cursor,
+    )))
+
+
+def test_task_list_flat(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.list(dto.TaskListRequest(runbook_uuid=hot.runbook.uuid, flat=True)))
+
+
+def test_task_list_with_status_runbook(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.list_with_status(dto.TaskListWithStatusRequest(
+        runbook_uuid=hot.runbook.uuid,
+    )))
+
+
+def test_task_list_with_status_parent(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.list_with_status(dto.TaskListWithStatusRequest(
+        parent_task_uuid=hot.root.uuid,
+    )))
+
+
+def test_task_search(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.search(dto.TaskSearchRequest(
+        query='task', project_uuid=hot.project.uuid,
+    )))
+
+
+def test_task_status_updates(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.get_status_updates(dto.TaskGetStatusUpdatesRequest(
+        task_uuid=hot.leaf.uuid,
+    )))
+
+
+def test_task_status_updates_next_page(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.get_status_updates(dto.TaskGetStatusUpdatesRequest(
+        task_uuid=hot.leaf.uuid, limit=1, cursor=hot.status_cursor,
+    )))
+
+
+def test_task_update_status(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.update_status(dto.TaskUpdateStatusRequest(
+        task_uuid=hot.leaf.uuid, status='ERROR', detail='failed',
+    )))
+
+
+def test_task_update_status_batch(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.update_status_batch(dto.TaskUpdateStatusBatchRequest(
+        updates=[
+            dto.TaskUpdateStatusRequest(task_uuid=subtask.uuid, status='COMPLETED', detail='done')
+            for subtask in hot.root.subtasks
+        ],
+    )))
+
+
+def test_task_status_events(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.status_events(dto.TaskStatusEventsRequest(
+        runbook_uuid=hot.runbook.uuid, task_uuid=hot.root.uuid,
+    )))
+
+
+def test_task_rebuild_subtask_counters_runbook(hot):
+    assert_no_full_scans(hot, lambda: hot.tasks.rebuild_subtask_counters(
+        dto.TaskRebuildSubtaskCountersRequest(runbook_uuid=hot.runbook.uuid, verify_only=True),
+    ))
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+import config
+import dto
+import model
+import service
+
+
+@pytest.fixture
+def wal_db(tmp_path):
+    # writers must not wait for the export to finish
+    engine, _ = model.create_engines(config.Settings(database_url=f'sqlite:///{tmp_path / "export.db"}'))
+    model.upgrade(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_export_reads_one_snapshot(wal_db):
+    projects = service.ProjectService(wal_db)
+    runbooks = service.RunbookService(wal_db)
+    tasks = service.TaskService(wal_db)
+    project = projects.create(dto.ProjectCreateRequest(name='export')).created
+    runbook = runbooks.create(dto.RunbookCreateRequest(
+        project_uuid=project.uuid, name='export', source='a', target='b',
+    )).created
+    task, = tasks.structure_import(dto.TaskStructureImportRequest.model_validate({
+        'runbook_uuid': runbook.uuid,
+        'tasks': [{'description': 'task', 'subtasks': []}],
+    })).tasks
+    tasks.update_status(dto.TaskUpdateStatusRequest(task_uuid=task.uuid, status='IN_PROGRESS', detail='before'))
+
+    export = runbooks.open_export(dto.RunbookExportRequest(uuid=runbook.uuid, include_history=True))
+    lines = export.lines()
+    assert json.loads(next(lines).model_dump_json())['uuid'] == runbook.uuid
+
+    # committed while the export is under way, after its snapshot was taken
+    tasks.update_status(dto.TaskUpdateStatusRequest(task_uuid=task.uuid, status='COMPLETED', detail='after'))
+
+    rest = [line.model_dump() for line in lines]
+    export.close()
+    assert [line['detail'] for line in rest if line['type'] == 'status'] == ['before']
@@ -0,0 +1,61 @@
+import asyncio
+import gzip
+
+import pytest
+
+from service import static
+from service.static import StaticAssets
+
+
+def get(app: StaticAssets, path: str, headers: dict[str, str]) -> tuple[int, dict[str, str], bytes]:
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'root_path': '',
+        'headers': [(name.encode(), value.encode()) for name, value in headers.items()],
+    }
+    asyncio.run(app(scope, receive, send))
+    start, body = messages[0], b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body
+
+
+@pytest.fixture
+def assets(tmp_path) -> StaticAssets:
+    (tmp_path / 'index.html').write_text('<html>' + 'waverunner ' * 200 + '</html>')
+    (tmp_path / 'main.10f2f7a8f2e40975.js').write_text('console.log("waverunner");' * 100)
+    return StaticAssets(str(tmp_path))
+
+
+def test_loads_on_first_request_and_negotiates_encoding(assets: StaticAssets):
+    assert assets.assets is None
+
+    status, headers, body = get(assets, '/', {'accept-encoding': 'gzip'})
+    assert status == 200
+    assert headers['content-encoding'] == 'gzip'
+    assert headers['cache-control'] == 'no-cache'
+    assert gzip.decompress(body).startswith(b'<html>')
+
+    status, headers, _ = get(assets, '/', {'if-none-match': headers['etag'], 'accept-encoding': 'gzip'})
+    assert status == 304
+
+    status, headers, body = get(assets, '/main.10f2f7a8f2e40975.js', {})
+    assert status == 200
+    assert 'content-encoding' not in headers
+    assert headers['cache-control'] == static.IMMUTABLE
+
+
+@pytest.mark.skipif(static.brotli is None, reason='brotli not installed')
+def test_prefers_brotli(assets: StaticAssets):
+    status, headers, body = get(assets, '/index.html', {'accept-encoding': 'gzip, br'})
+    assert status == 200
+    assert headers['content-encoding'] == 'br'
+    assert static.brotli.decompress(body).startswith(b'<html>')
@@ -0,0 +1,56 @@
+import uuid
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+import dto
+import model
+import service
+
+
+def test_etag_of_missing_task_is_not_cached(db: Engine):
+    tasks = service.TaskService(db=db)
+    task_uuid = str(uuid.uuid4())
+    req = dto.TaskGetRequest(uuid=task_uuid)
+    assert tasks.etag(req, task_uuid=task_uuid) is None
+
+    # shows up later, e.g. once a lagging read_db catches up
+    with Session(db) as session:
+        project = model.Project(uuid=str(uuid.uuid4()), name='etag')
+        runbook = model.Runbook(uuid=str(uuid.uuid4()), name='etag', source='a', target='b', project=project)
+        session.add_all([project, runbook, model.Task(uuid=task_uuid, description='task', runbook=runbook)])
+        session.commit()
+        runbook_uuid = runbook.uuid
+
+    etag = tasks.etag(req, task_uuid=task_uuid)
+    assert etag is not None and etag.startswith(f'"{runbook_uuid}.0.')
+
+
+def test_etag_never_pairs_a_new_version_with_a_cached_body(db: Engine):
+    # two workers on one database, the change feed not having run yet
+    worker_a = service.TaskService(db=db)
+    worker_b = service.TaskService(db=db)
+    with Session(db) as session:
+        project = model.Project(uuid=str(uuid.uuid4()), name='etag')
+        runbook = model.Runbook(uuid=str(uuid.uuid4()), name='etag', source='a', target='b', project=project)
+        session.add_all([project, runbook])
+        session.commit()
+        runbook_uuid = runbook.uuid
+    root = worker_a.create(dto.TaskCreateRequest(runbook_uuid=runbook_uuid, description='root')).created
+    leaf = worker_a.create(dto.TaskCreateRequest(runbook_uuid=runbook_uuid, description='leaf', parent=root.uuid)).created
+
+    def read_on_b() -> tuple[str, dto.TaskGetResponse]:
+        # as the /task/get route does: the etag first, then the body
+        req = dto.TaskGetRequest(uuid=root.uuid, calculate_progress=True)
+        return worker_b.etag(req, task_uuid=root.uuid), worker_b.get(req)
+
+    etag, response = read_on_b()
+    assert response.progress.not_started == 1 and len(response.task.subtasks) == 1
+
+    worker_a.update_status(dto.TaskUpdateStatusRequest(task_uuid=leaf.uuid, status='COMPLETED', detail='done'))
+    worker_a.create(dto.TaskCreateRequest(runbook_uuid=runbook_uuid, description='new leaf', parent=root.uuid))
+
+    new_etag, response = read_on_b()
+    assert new_etag != etag
+    assert response.progress.completed == 1 and response.progress.not_started == 1
+    assert len(response.task.subtasks) == 2
@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+from sqlalchemy import Engine, create_engine, func, select
+from sqlalchemy.orm import Session
+
+import dto
+import model
+import service
+
+
+def test_stream_import_takes_no_lock_while_receiving(tmp_path):
+    # a short busy timeout, so a lock held during the upload fails the test fast
+    db: Engine = create_engine(f'sqlite:///{tmp_path / "import.db"}', connect_args={'timeout': 0.5})
+    model.upgrade(db)
+    projects = service.ProjectService(db)
+    runbooks = service.RunbookService(db)
+    tasks = service.TaskService(db)
+    project = projects.create(dto.ProjectCreateRequest(name='import')).created
+    runbook = runbooks.create(dto.RunbookCreateRequest(
+        project_uuid=project.uuid, name='import', source='a', target='b',
+    )).created
+
+    lines = [json.dumps({'description': f'task {i}', 'depth': min(i, 1)}).encode() + b'\n' for i in range(3000)]
+
+    async def upload():
+        for i in range(0, len(lines), 500):
+            yield b''.join(lines[i:i + 500])
+            # other writers go on while the upload is under way
+            tasks.create(dto.TaskCreateRequest(runbook_uuid=runbook.uuid, description=f'created during upload {i}'))
+
+    async def receive_and_import():
+        with await service.spool(upload(), max_memory=16 * 1024) as body:
+            return tasks.structure_import_stream(runbook.uuid, body)
+
+    response = asyncio.run(receive_and_import())
+    assert response.imported == 3000 and len(response.root_uuids) == 1
+
+    with Session(db) as session:
+        count = session.scalar(select(func.count()).where(model.Task.runbook_uuid == runbook.uuid))
+    assert count == 3000 + 6
+    db.dispose()
@@ -0,0 +1,74 @@
+from typing import Callable, Optional
+
+import pytest
+from sqlalchemy import Engine, literal_column, select
+from sqlalchemy.orm import Session
+
+import dto
+import model
+import service
+
+
+@pytest.fixture
+def runbook(db: Engine) -> tuple[service.TaskService, str, list[dto.TaskDto]]:
+    projects = service.ProjectService(db)
+    runbooks = service.RunbookService(db)
+    tasks = service.TaskService(db)
+    project = projects.create(dto.ProjectCreateRequest(name='list')).created
+    runbook = runbooks.create(dto.RunbookCreateRequest(
+        project_uuid=project.uuid, name='list', source='a', target='b',
+    )).created
+    roots = tasks.structure_import(dto.TaskStructureImportRequest.model_validate({
+        'runbook_uuid': runbook.uuid,
+        'tasks': [
+            {'description': f'task {i:02d}', 'subtasks': [
+                {'description': f'task {i:02d}.{j:02d}', 'subtasks': []} for j in range(12)
+            ]} for i in range(12)
+        ],
+    })).tasks
+    return tasks, runbook.uuid, roots
+
+
+def all_pages(read: Callable[[Optional[str]], tuple[list, Optional[str]]]) -> list[str]:
+    descriptions, cursor = [], None
+    while True:
+        tasks, cursor = read(cursor)
+        descriptions += [task.description for task in tasks]
+        if cursor is None:
+            return descriptions
+
+
+def test_lists_page_in_insertion_order(runbook):
+    tasks, runbook_uuid, roots = runbook
+    root_descriptions = [root.description for root in roots]
+
+    def roots_page(cursor):
+        page = tasks.list(dto.TaskListRequest(runbook_uuid=runbook_uuid, page_size=5, cursor=cursor))
+        return page.tasks, page.next_cursor
+
+    def flat_page(cursor):
+        page = tasks.list(dto.TaskListRequest(runbook_uuid=runbook_uuid, flat=True, page_size=5, cursor=cursor))
+        return page.tasks, page.next_cursor
+
+    def roots_with_status_page(cursor):
+        page = tasks.list_with_status(dto.TaskListWithStatusRequest(
+            runbook_uuid=runbook_uuid, page_size=5, cursor=cursor,
+        ))
+        return page.tasks, page.next_cursor
+
+    def subtasks_page(cursor):
+        page = tasks.list_with_status(dto.TaskListWithStatusRequest(
+            parent_task_uuid=roots[3].uuid, page_size=5, cursor=cursor,
+        ))
+        return page.tasks, page.next_cursor
+
+    assert all_pages(roots_page) == root_descriptions
+    assert all_pages(roots_with_status_page) == root_descriptions
+    assert all_pages(subtasks_page) == [subtask.description for subtask in roots[3].subtasks]
+    with Session(tasks.db) as session:
+        inserted = session.scalars(
+            select(model.Task.description).
+            where(model.Task.runbook_uuid == runbook_uuid).
+            order_by(literal_column('rowid'))
+        ).all()
+    assert all_pages(flat_page) == inserted and len(set(inserted)) == 12 * 13
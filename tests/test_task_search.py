@@ -0,0 +1,168 @@
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Engine, func, select, text
+
+import dto
+import model
+import service
+
+
+@pytest.fixture
+def services(db: Engine) -> tuple[service.TaskService, service.RunbookService, str]:
+    projects = service.ProjectService(db)
+    runbooks = service.RunbookService(db)
+    project = projects.create(dto.ProjectCreateRequest(name='search')).created
+    return service.TaskService(db), runbooks, project.uuid
+
+
+def new_runbook(runbooks: service.RunbookService, project_uuid: str, name: str) -> str:
+    return runbooks.create(dto.RunbookCreateRequest(
+        project_uuid=project_uuid, name=name, source='a', target='b',
+    )).created.uuid
+
+
+def search(tasks: service.TaskService, query: str, **kwargs) -> list[str]:
+    hits, cursor = [], None
+    while True:
+        page = tasks.search(dto.TaskSearchRequest(query=query, cursor=cursor, **kwargs))
+        hits += [hit.task.uuid for hit in page.hits]
+        cursor = page.next_cursor
+        if cursor is None:
+            return hits
+
+
+def test_triggers_index_every_write(services):
+    tasks, runbooks, project_uuid = services
+    runbook_uuid = new_runbook(runbooks, project_uuid, 'writes')
+
+    created = tasks.create(dto.TaskCreateRequest(runbook_uuid=runbook_uuid, description='provision database')).created
+    imported = tasks.structure_import(dto.TaskStructureImportRequest.model_validate({
+        'runbook_uuid': runbook_uuid,
+        'tasks': [{'description': 'migrate schema', 'subtasks': [
+            {'description': 'rename columns', 'subtasks': []},
+        ]}],
+    })).tasks[0]
+    assert search(tasks, 'provision') == [created.uuid]
+    assert search(tasks, 'schema') == [imported.uuid]
+    assert search(tasks, 'rename') == [imported.subtasks[0].uuid]
+
+    tasks.update_status(dto.TaskUpdateStatusRequest(
+        task_uuid=created.uuid, status=model.TaskStatus.ERROR, detail='disk quota exceeded',
+    ))
+    assert search(tasks, 'quota') == [created.uuid]
+
+    clone_uuid = runbooks.clone(dto.RunbookCloneRequest(uuid=runbook_uuid, name='copy')).created.uuid
+    assert len(search(tasks, 'migrate')) == 2
+    cloned = search(tasks, 'migrate', runbook_uuid=clone_uuid)
+    assert len(cloned) == 1 and cloned != [imported.uuid]
+    # the copies have no status, so nor are their details indexed
+    assert search(tasks, 'quota', runbook_uuid=clone_uuid) == []
+
+
+def test_rollup_details_are_not_indexed(services):
+    tasks, runbooks, project_uuid = services
+    runbook_uuid = new_runbook(runbooks, project_uuid, 'rollup')
+    parent = tasks.structure_import(dto.TaskStructureImportRequest.model_validate({
+        'runbook_uuid': runbook_uuid,
+        'tasks': [{'description': 'parent', 'subtasks': [
+            {'description': 'child one', 'subtasks': []},
+            {'description': 'child two', 'subtasks': []},
+        ]}],
+    })).tasks[0]
+    for child in parent.subtasks:
+        tasks.update_status(dto.TaskUpdateStatusRequest(
+            task_uuid=child.uuid, status=model.TaskStatus.COMPLETED, detail='done',
+        ))
+
+    rollups = tasks.get_status_updates(dto.TaskGetStatusUpdatesRequest(task_uuid=parent.uuid)).updates
+    assert rollups and all(update.updated_by == model.ROLLUP_UPDATED_BY for update in rollups)
+    assert search(tasks, 'subtasks') == []
+    assert search(tasks, 'completed') == []
+    assert set(search(tasks, 'done')) == {child.uuid for child in parent.subtasks}
+
+
+def test_upgrade_backfills_a_database_without_the_index(services):
+    tasks, runbooks, project_uuid = services
+    runbook_uuid = new_runbook(runbooks, project_uuid, 'backfill')
+    imported = tasks.structure_import(dto.TaskStructureImportRequest.model_validate({
+        'runbook_uuid': runbook_uuid,
+        'tasks': [{'description': f'step {i}', 'subtasks': [
+            {'description': f'check {i}', 'subtasks': []},
+        ]} for i in range(3)],
+    })).tasks
+    for root in imported:
+        task_uuid = root.subtasks[0].uuid
+        tasks.update_status(dto.TaskUpdateStatusRequest(
+            task_uuid=task_uuid, status=model.TaskStatus.IN_PROGRESS, detail='waiting on approval',
+        ))
+        tasks.update_status(dto.TaskUpdateStatusRequest(
+            task_uuid=task_uuid, status=model.TaskStatus.COMPLETED, detail='approved',
+        ))
+    # every task completed, so the earlier details move to the archive
+    assert tasks.compact_status_history(dto.TaskCompactStatusHistoryRequest(runbook_uuid=runbook_uuid)).archived > 0
+
+    queries = ['step', 'check', 'approval', 'approved', 'subtasks']
+    before = {query: sorted(search(tasks, query)) for query in queries}
+    with tasks.db.connect() as connection:
+        rows = connection.scalar(select(func.count()).select_from(model.task_search))
+
+    # as a database from before the index: neither the table nor its triggers
+    with tasks.db.begin() as connection:
+        for trigger in ('task_search_tasks_insert', 'task_search_task_status_insert'):
+            connection.execute(text(f'DROP TRIGGER {trigger}'))
+        connection.execute(text('DROP TABLE task_search'))
+    model.upgrade(tasks.db)
+
+    with tasks.db.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(model.task_search)) == rows
+    assert {query: sorted(search(tasks, query)) for query in queries} == before
+    assert len(before['approval']) == 3 and before['subtasks'] == []
+
+    # and the triggers are back
+    created = tasks.create(dto.TaskCreateRequest(runbook_uuid=runbook_uuid, description='after upgrade')).created
+    assert search(tasks, 'upgrade') == [created.uuid]
+
+
+def test_pages_have_no_duplicates_or_gaps(services):
+    tasks, runbooks, project_uuid = services
+    runbook_uuid = new_runbook(runbooks, project_uuid, 'paging')
+    imported = tasks.structure_import(dto.TaskStructureImportRequest.model_validate({
+        'runbook_uuid': runbook_uuid,
+        # repeated words give ties in rank, so pages are also cut between equal ranks
+        'tasks': [{'description': ' '.join(['deploy'] * (i % 4 + 1) + ['service']), 'subtasks': []} for i in range(57)],
+    })).tasks
+    tasks.update_status(dto.TaskUpdateStatusRequest(
+        task_uuid=imported[0].uuid, status=model.TaskStatus.ERROR, detail='deploy failed',
+    ))
+
+    unpaged = search(tasks, 'deploy', page_size=500)
+    assert sorted(unpaged) == sorted(task.uuid for task in imported)
+    for page_size in (1, 5, 10, 56):
+        assert search(tasks, 'deploy', page_size=page_size) == unpaged
+
+
+@pytest.mark.parametrize('query, matches', [
+    ('"; DROP', 0),
+    ('-deploy', 1),
+    ('(deploy', 1),
+    ('deploy*', 1),
+    # operators and column filters are searched for as words, and none is in the description
+    ('deploy OR rollback', 0),
+    ('NEAR(deploy service)', 0),
+    ('content:deploy', 0),
+])
+def test_query_syntax_is_neutralised(services, query, matches):
+    tasks, runbooks, project_uuid = services
+    runbook_uuid = new_runbook(runbooks, project_uuid, 'syntax')
+    tasks.create(dto.TaskCreateRequest(runbook_uuid=runbook_uuid, description='deploy service'))
+    assert len(search(tasks, query)) == matches
+
+
+@pytest.mark.parametrize('query', ['*', '"', '()', ' - '])
+def test_query_without_words_is_rejected(services, query):
+    tasks, _, _ = services
+    with pytest.raises(HTTPException) as error:
+        tasks.search(dto.TaskSearchRequest(query=query))
+    assert error.value.status_code == HTTPStatus.BAD_REQUEST
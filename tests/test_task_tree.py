@@ -0,0 +1,81 @@
+import contextlib
+import uuid
+from typing import Optional
+
+import pytest
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session
+
+import dto
+import model
+import service
+
+
+def generate(db: Engine) -> str:
+    """
+    A runbook of three levels of three tasks, each depending on its previous
+    sibling, and every last sibling also on a task of another runbook (which
+    itself has a parent and a dependency). Returns the uuid of the first root.
+    """
+    with Session(db) as session:
+        project = model.Project(uuid=str(uuid.uuid4()), name='tree')
+        runbook = model.Runbook(uuid=str(uuid.uuid4()), name='tree', source='a', target='b', project=project)
+        other = model.Runbook(uuid=str(uuid.uuid4()), name='other', source='a', target='b', project=project)
+        other_parent = model.Task(uuid=str(uuid.uuid4()), description='other parent', runbook=other)
+        other_dependency = model.Task(uuid=str(uuid.uuid4()), description='other dependency', runbook=other)
+        other_task = model.Task(
+            uuid=str(uuid.uuid4()), description='other task', runbook=other,
+            parent=other_parent, dependency=other_dependency,
+        )
+        session.add_all([project, runbook, other, other_parent, other_dependency, other_task])
+
+        def add_level(parent: Optional[model.Task], depth: int) -> list[model.Task]:
+            level: list[model.Task] = []
+            for i in range(3):
+                task = model.Task(
+                    uuid=str(uuid.uuid4()),
+                    description=f'{parent.description if parent else "task"}.{i}',
+                    runbook=runbook,
+                    parent=parent,
+                    dependency=level[-1] if level else None,
+                )
+                if i == 2:
+                    task.dependency = other_task
+                session.add(task)
+                session.flush()
+                level.append(task)
+                if depth < 2:
+                    add_level(task, depth + 1)
+            return level
+
+        root_uuid = add_level(None, 0)[0].uuid
+        session.commit()
+        return root_uuid
+
+
+@contextlib.contextmanager
+def count_queries(db: Engine):
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db, 'before_cursor_execute', record)
+
+
+@pytest.mark.parametrize('max_depth', [None, 0, 1])
+def test_get_loads_tree_in_one_query(db: Engine, max_depth: Optional[int]):
+    root_uuid = generate(db)
+    tasks = service.TaskService(db=db)
+
+    with count_queries(db) as statements:
+        task = tasks.get(dto.TaskGetRequest(uuid=root_uuid, max_subtasks_depth=max_depth)).task
+    assert len(statements) == 1
+
+    with Session(db) as session:
+        expected = dto.TaskDto.from_model(session.get(model.Task, root_uuid), max_depth)
+        assert task.model_dump() == expected.model_dump()